@@ -0,0 +1,60 @@
+"""
+File System Utilities
+Non-blocking file helpers shared by the agents
+"""
+
+import asyncio
+from pathlib import Path
+from typing import Optional, Set
+
+# Directories already created by this process
+_created_dirs: Set[str] = set()
+
+
+def ensure_dir(path: str):
+    """
+    Create a directory tree once per process.
+    
+    Later calls for the same path return without touching the file system.
+    """
+    
+    if path in _created_dirs:
+        return
+    Path(path).mkdir(parents=True, exist_ok=True)
+    _created_dirs.add(path)
+
+
+def _read_text_sync(path: str, encoding: Optional[str] = None) -> str:
+    with open(path, 'r', encoding=encoding) as f:
+        return f.read()
+
+
+def _read_bytes_sync(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _write_text_sync(path: str, content: str, encoding: Optional[str] = None):
+    with open(path, 'w', encoding=encoding) as f:
+        f.write(content)
+
+
+async def read_text(path: str, encoding: Optional[str] = None) -> str:
+    """Read a text file from a worker thread so the event loop keeps running"""
+    return await asyncio.to_thread(_read_text_sync, path, encoding)
+
+
+async def read_bytes(path: str) -> bytes:
+    """Read a file's raw bytes from a worker thread"""
+    return await asyncio.to_thread(_read_bytes_sync, path)
+
+
+async def write_text(path: str, content: str, encoding: Optional[str] = None):
+    """Write a text file from a worker thread so the event loop keeps running"""
+    await asyncio.to_thread(_write_text_sync, path, content, encoding)
+
+
+async def make_dirs(path: str):
+    """Create a directory tree from a worker thread unless already created"""
+    if path not in _created_dirs:
+        await asyncio.to_thread(ensure_dir, path)
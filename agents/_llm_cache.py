@@ -0,0 +1,212 @@
+"""
+LLM Response Cache
+Content-addressed disk cache for model responses
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from agents._fsutil import ensure_dir
+from agents._tokens import check_prompt_size
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = "./output/.llm_cache"
+
+# Model calls currently running, keyed by (namespace, prompt digest)
+_in_flight: Dict[Tuple[str, str], "asyncio.Future[str]"] = {}
+
+
+def _cache_enabled() -> bool:
+    """The cache is on unless NAUTO_LLM_CACHE=off"""
+    return os.getenv("NAUTO_LLM_CACHE", "on").strip().lower() != "off"
+
+
+def _json_bytes(obj: Any, sort_keys: bool) -> bytes:
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=option)
+    return json.dumps(
+        obj,
+        sort_keys=sort_keys,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str
+    ).encode("utf-8")
+
+
+def canonical_json(obj: Any) -> bytes:
+    """Serialize obj to JSON bytes with sorted keys, stable across runs"""
+    return _json_bytes(obj, sort_keys=True)
+
+
+def content_digest(obj: Any) -> str:
+    """BLAKE2b digest of obj's canonical JSON form"""
+    return hashlib.blake2b(canonical_json(obj), digest_size=16).hexdigest()
+
+
+def ordered_digest(obj: Any) -> str:
+    """BLAKE2b digest of obj's JSON form with dict keys in insertion order"""
+    return hashlib.blake2b(
+        _json_bytes(obj, sort_keys=False),
+        digest_size=16
+    ).hexdigest()
+
+
+def _cache_key(model: Any, prompt: str) -> str:
+    """Digest of the model name and the full prompt text"""
+    model_name = getattr(model, "model_name", type(model).__name__)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(model_name).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(prompt.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _read_entry(path: str) -> Optional[str]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+class _EntryWriter:
+    """
+    Writes a cache entry incrementally as response chunks arrive.
+    
+    Chunks go to a temporary file that is renamed into place on commit, so
+    readers never see a partial entry. I/O errors only disable the entry;
+    they never fail the generation itself.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = f"{path}.{os.getpid()}.{id(self)}.tmp"
+        self._file = None
+    
+    def open(self):
+        try:
+            ensure_dir(os.path.dirname(self.path))
+            self._file = open(self.tmp_path, 'w', encoding='utf-8')
+        except OSError as e:
+            logger.warning(f"LLM cache write failed: {str(e)}")
+    
+    def write(self, text: str):
+        if self._file is None:
+            return
+        try:
+            self._file.write(text)
+        except OSError as e:
+            logger.warning(f"LLM cache write failed: {str(e)}")
+            self.discard()
+    
+    def commit(self):
+        if self._file is None:
+            return
+        try:
+            self._file.close()
+            self._file = None
+            os.replace(self.tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"LLM cache write failed: {str(e)}")
+            self.discard()
+    
+    def discard(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+
+async def _stream_to_entry(model: Any, prompt: str, path: str) -> str:
+    """Stream a response, writing each chunk through to the cache entry"""
+
+    response = await model.generate_content_async(prompt, stream=True)
+
+    # Models that ignore stream=True hand back the whole response at once
+    chunks = response if hasattr(response, "__aiter__") else None
+
+    writer = _EntryWriter(path)
+    await asyncio.to_thread(writer.open)
+
+    parts = []
+    try:
+        if chunks is None:
+            parts.append(response.text)
+            await asyncio.to_thread(writer.write, response.text)
+        else:
+            async for chunk in chunks:
+                parts.append(chunk.text)
+                await asyncio.to_thread(writer.write, chunk.text)
+    except BaseException:
+        await asyncio.to_thread(writer.discard)
+        raise
+
+    await asyncio.to_thread(writer.commit)
+    return "".join(parts)
+
+
+async def _generate(model: Any, prompt: str, path: Optional[str]) -> str:
+    """Serve a prompt from the cache file at path, or call the model"""
+
+    # Fail fast instead of paying for a request the model will reject
+    check_prompt_size(prompt)
+
+    if path is None:
+        response = await model.generate_content_async(prompt)
+        return response.text
+
+    try:
+        cached = await asyncio.to_thread(_read_entry, path)
+    except Exception as e:
+        logger.warning(f"LLM cache read failed: {str(e)}")
+        cached = None
+
+    if cached is not None:
+        logger.debug(f"LLM cache hit: {path}")
+        return cached
+
+    return await _stream_to_entry(model, prompt, path)
+
+
+async def cached_generate(model: Any, prompt: str, namespace: str) -> str:
+    """
+    Return the model's response text for a prompt, serving repeats from disk.
+
+    Entries live under CACHE_DIR/<namespace>/<key>.txt, where the key is a
+    BLAKE2b digest of the model name and the full prompt, so any change to
+    the template or the specification yields a fresh entry. Identical
+    prompts requested concurrently share a single model call.
+    """
+
+    key = _cache_key(model, prompt)
+    flight_key = (namespace, key)
+
+    task = _in_flight.get(flight_key)
+    if task is None:
+        path = (
+            os.path.join(CACHE_DIR, namespace, f"{key}.txt")
+            if _cache_enabled() else None
+        )
+        task = asyncio.ensure_future(_generate(model, prompt, path))
+        _in_flight[flight_key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(flight_key, None))
+
+    # Shield the shared call so one cancelled caller does not cancel it
+    # for the others waiting on the same prompt
+    return await asyncio.shield(task)
@@ -0,0 +1,53 @@
+"""
+Text Utilities
+Helpers for cleaning up model responses
+"""
+
+import asyncio
+
+# Responses shorter than this are cleaned inline; the worker thread hop
+# costs more than the string work
+OFFLOAD_THRESHOLD = 64 * 1024
+
+
+def strip_code_fences(text: str) -> str:
+    """
+    Remove a surrounding Markdown code fence from a model response.
+    
+    Slices the content between the opening fence line and the closing
+    fence without splitting the response into lines.
+    """
+    
+    if not text.startswith("```"):
+        return text
+    
+    start = text.find("\n") + 1
+    if start == 0:
+        return ""
+    
+    end = text.rfind("\n```")
+    if end == -1:
+        return text[start:]
+    
+    return text[start:end] if end >= start else ""
+
+
+def clean_response(text: str, yaml_document: bool = False) -> str:
+    """
+    Trim a model response and remove its code fence.
+    
+    With yaml_document, the result is guaranteed to start with "---".
+    """
+    
+    content = strip_code_fences(text.strip())
+    if yaml_document and not content.startswith("---"):
+        content = "---\n" + content
+    return content
+
+
+async def clean_response_async(text: str, yaml_document: bool = False) -> str:
+    """clean_response(), run in a worker thread for large responses"""
+    
+    if len(text) < OFFLOAD_THRESHOLD:
+        return clean_response(text, yaml_document)
+    return await asyncio.to_thread(clean_response, text, yaml_document)
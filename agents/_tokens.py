@@ -0,0 +1,34 @@
+"""
+Token Estimation
+Cheap prompt-size estimates for metrics and pre-flight checks
+"""
+
+# Gemini 2.0 Flash accepts about one million input tokens; keep headroom
+# for the response itself
+MODEL_CONTEXT_TOKENS = 1_048_576
+RESPONSE_RESERVE_TOKENS = 2048
+
+# Gemini averages roughly four characters per token on English prose and YAML
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the number of tokens in text"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def check_prompt_size(prompt: str) -> int:
+    """
+    Estimate a prompt's token count and reject prompts that cannot fit.
+    
+    Raises:
+        ValueError: if the prompt would overflow the model context window
+    """
+    
+    tokens = estimate_tokens(prompt)
+    if tokens > MODEL_CONTEXT_TOKENS - RESPONSE_RESERVE_TOKENS:
+        raise ValueError(
+            f"Prompt too large: ~{tokens} tokens exceeds the "
+            f"{MODEL_CONTEXT_TOKENS - RESPONSE_RESERVE_TOKENS} token budget"
+        )
+    return tokens
@@ -4,14 +4,191 @@ Generates production-ready Ansible playbooks from specifications
 """
 
 import os
+import re
+import asyncio
+import functools
 import logging
 import yaml
-from typing import Dict, Any
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
+
+from agents._fsutil import ensure_dir, make_dirs, read_text, write_text
+from agents._llm_cache import cached_generate, ordered_digest
+from agents._textutil import clean_response_async
+from agents._tokens import estimate_tokens
 
 logger = logging.getLogger(__name__)
 
+try:
+    from yaml import CSafeDumper as _Dumper
+except ImportError:
+    from yaml import SafeDumper as _Dumper
+    logger.warning(
+        "PyYAML was built without libyaml; falling back to the pure-Python "
+        "dumper (install libyaml-dev and reinstall PyYAML for faster output)"
+    )
+
+# Shared dump settings; keys keep the order the specification gave them
+_dump_yaml = functools.partial(
+    yaml.dump,
+    Dumper=_Dumper,
+    default_flow_style=False,
+    sort_keys=False,
+    allow_unicode=True,
+    width=120
+)
+
+# Rendered specification prompt sections keyed by an order-preserving digest
+# of the spec, so repeat generations for the same spec skip the YAML dumps
+# and send a byte-identical prompt. The rendering keeps the spec's key
+# order, so the key must too
+_SPEC_SECTIONS_CACHE_SIZE = 32
+_spec_sections_cache: "OrderedDict[str, str]" = OrderedDict()
+
+
+def _render_spec_sections(parsed_spec: Dict[str, Any]) -> str:
+    """Render the per-spec part of the playbook prompt, memoized"""
+    
+    try:
+        key = ordered_digest(parsed_spec)
+    except TypeError:
+        # Values JSON cannot represent (e.g. YAML !!set) skip the memo
+        key = None
+    
+    sections = _spec_sections_cache.get(key)
+    if sections is not None:
+        _spec_sections_cache.move_to_end(key)
+        return sections
+    
+    sections = f"""
+Specification:
+
+Name: {parsed_spec['name']}
+Description: {parsed_spec['description']}
+
+Target Devices:
+{_dump_yaml(parsed_spec['target_devices'])}
+
+Tasks:
+{_dump_yaml(parsed_spec['tasks'])}
+
+Requirements:
+{_dump_yaml(parsed_spec.get('requirements', {}))}
+"""
+    
+    if key is None:
+        return sections
+    
+    _spec_sections_cache[key] = sections
+    if len(_spec_sections_cache) > _SPEC_SECTIONS_CACHE_SIZE:
+        _spec_sections_cache.popitem(last=False)
+    
+    return sections
+
+# Static instruction blocks are kept ahead of the per-spec fields so that
+# repeated calls share an identical prompt prefix, which Gemini can cache.
+ANSIBLE_SYSTEM_PROMPT = """
+You are an expert Ansible developer. Generate a production-ready Ansible playbook based on the specification below.
+
+Generate a complete, production-ready Ansible playbook that:
+1. Follows Ansible best practices
+2. Includes proper error handling
+3. Is idempotent
+4. Has clear task names and descriptions
+5. Uses proper YAML formatting
+6. Includes gather_facts, tags, and handlers where appropriate
+7. Implements security best practices (no hardcoded credentials)
+8. Uses variables for flexibility
+9. Includes pre-flight checks
+10. Has comprehensive logging
+
+Output ONLY the YAML playbook content, no explanations or markdown.
+Start with:
+---
+- name: [playbook name]
+"""
+
+REFINE_SYSTEM_PROMPT = """
+You are an expert Ansible developer. Refine the Ansible playbook below based on the feedback.
+
+Generate the improved playbook. Output ONLY the YAML content, no explanations.
+"""
+
+_ANSIBLE_CFG = """[defaults]
+inventory = inventory/hosts.yml
+host_key_checking = False
+retry_files_enabled = False
+gathering = smart
+fact_caching = jsonfile
+fact_caching_connection = /tmp/ansible_facts
+fact_caching_timeout = 86400
+stdout_callback = yaml
+callbacks_enabled = profile_tasks, timer
+
+[privilege_escalation]
+become = False
+
+[ssh_connection]
+pipelining = True
+ssh_args = -o ControlMaster=auto -o ControlPersist=60s
+"""
+
+
+# Short strings YAML emits unquoted and reads back as strings (longer
+# mapping keys switch to the explicit "? key" form)
+_PLAIN_SCALAR = re.compile(r"[A-Za-z][A-Za-z0-9_-]{0,63}")
+_YAML_KEYWORDS = frozenset(
+    ("yes", "no", "true", "false", "on", "off", "y", "n", "null")
+)
+
+
+def _is_plain_scalar(value: Any) -> bool:
+    return (
+        isinstance(value, str)
+        and _PLAIN_SCALAR.fullmatch(value) is not None
+        and value.lower() not in _YAML_KEYWORDS
+    )
+
+
+def _write_inventory(device_groups: Dict[Any, Dict[str, Any]]) -> Optional[str]:
+    """
+    Serialize inventory groups directly, matching yaml.dump byte for byte.
+    
+    Returns None when a device type or connection would need YAML quoting,
+    leaving those inventories to the generic dumper.
+    """
+    
+    out: List[str] = ["all:\n", "  children:"]
+    if not device_groups:
+        out.append(" {}\n")
+        return "".join(out)
+    out.append("\n")
+    
+    for device_type, group in device_groups.items():
+        connection = group["vars"]["ansible_connection"]
+        if not (_is_plain_scalar(device_type) and _is_plain_scalar(connection)):
+            return None
+        
+        out.append("    %s:\n      hosts:" % device_type)
+        hosts = group["hosts"]
+        if hosts:
+            out.append("\n")
+            for host_name, host_vars in hosts.items():
+                out.append(
+                    "        %s:\n          ansible_host: %s\n"
+                    % (host_name, host_vars["ansible_host"])
+                )
+        else:
+            out.append(" {}\n")
+        out.append(
+            "      vars:\n        ansible_network_os: %s\n"
+            "        ansible_connection: %s\n" % (device_type, connection)
+        )
+    
+    return "".join(out)
+
 
 class AnsibleGeneratorAgent:
     """
@@ -29,16 +206,20 @@ class AnsibleGeneratorAgent:
         """Initialize with Gemini model"""
         self.model = model
         self.output_dir = "./output/playbooks"
-        os.makedirs(self.output_dir, exist_ok=True)
+        ensure_dir(self.output_dir)
     
     async def generate_playbook(
         self,
         parsed_spec: Dict[str, Any],
-        session: Any
+        session: Any,
+        generated_at: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Generate a complete Ansible playbook from the specification.
         
+        Batch callers may pass one generated_at timestamp for a whole run;
+        otherwise the current UTC time is used.
+        
         Returns:
             Dictionary with file paths and metadata
         """
@@ -47,15 +228,13 @@ class AnsibleGeneratorAgent:
         session.increment_metric("agent_calls")
         
         try:
-            # Use AI to generate the playbook content
-            playbook_content = await self._generate_playbook_content(
-                parsed_spec,
-                session
+            # Use AI to generate the playbook content while the inventory
+            # file is built in a worker thread
+            playbook_content, inventory_content = await asyncio.gather(
+                self._generate_playbook_content(parsed_spec, session),
+                asyncio.to_thread(self._generate_inventory, parsed_spec)
             )
             
-            # Generate inventory file
-            inventory_content = self._generate_inventory(parsed_spec)
-            
             # Generate ansible.cfg
             config_content = self._generate_ansible_cfg(parsed_spec)
             
@@ -76,19 +255,14 @@ class AnsibleGeneratorAgent:
             )
             
             # Create inventory directory
-            os.makedirs(os.path.dirname(inventory_path), exist_ok=True)
-            
-            # Write playbook
-            with open(playbook_path, 'w') as f:
-                f.write(playbook_content)
-            
-            # Write inventory
-            with open(inventory_path, 'w') as f:
-                f.write(inventory_content)
+            await make_dirs(os.path.dirname(inventory_path))
             
-            # Write config
-            with open(config_path, 'w') as f:
-                f.write(config_content)
+            # Write playbook, inventory and config concurrently
+            await asyncio.gather(
+                write_text(playbook_path, playbook_content),
+                write_text(inventory_path, inventory_content),
+                write_text(config_path, config_content)
+            )
             
             logger.info(f"Playbook generated successfully: {playbook_path}")
             session.increment_metric("artifacts")
@@ -100,7 +274,7 @@ class AnsibleGeneratorAgent:
                 "config_path": config_path,
                 "playbook_name": playbook_name,
                 "metadata": {
-                    "generated_at": datetime.now().isoformat(),
+                    "generated_at": generated_at or datetime.now(timezone.utc).isoformat(timespec='seconds'),
                     "tasks_count": len(parsed_spec.get('tasks', [])),
                     "target_devices": len(parsed_spec.get('target_devices', []))
                 }
@@ -117,56 +291,18 @@ class AnsibleGeneratorAgent:
     ) -> str:
         """Use AI to generate the playbook content with best practices"""
         
-        prompt = f"""
-You are an expert Ansible developer. Generate a production-ready Ansible playbook based on this specification:
-
-Name: {parsed_spec['name']}
-Description: {parsed_spec['description']}
-
-Target Devices:
-{yaml.dump(parsed_spec['target_devices'], default_flow_style=False)}
-
-Tasks:
-{yaml.dump(parsed_spec['tasks'], default_flow_style=False)}
-
-Requirements:
-{yaml.dump(parsed_spec.get('requirements', {}), default_flow_style=False)}
-
-Generate a complete, production-ready Ansible playbook that:
-1. Follows Ansible best practices
-2. Includes proper error handling
-3. Is idempotent
-4. Has clear task names and descriptions
-5. Uses proper YAML formatting
-6. Includes gather_facts, tags, and handlers where appropriate
-7. Implements security best practices (no hardcoded credentials)
-8. Uses variables for flexibility
-9. Includes pre-flight checks
-10. Has comprehensive logging
-
-Output ONLY the YAML playbook content, no explanations or markdown.
-Start with:
----
-- name: [playbook name]
-"""
+        prompt = ANSIBLE_SYSTEM_PROMPT + _render_spec_sections(parsed_spec)
         
         try:
-            response = await self.model.generate_content_async(prompt)
-            session.increment_metric("tokens_used", len(prompt.split()))
-            
-            # Extract and clean the playbook content
-            playbook_content = response.text.strip()
-            
-            # Remove markdown code blocks if present
-            if playbook_content.startswith("```"):
-                lines = playbook_content.split("\n")
-                playbook_content = "\n".join(lines[1:-1])
-            
-            # Ensure it starts with ---
-            if not playbook_content.startswith("---"):
-                playbook_content = "---\n" + playbook_content
+            response_text = await cached_generate(
+                self.model,
+                prompt,
+                "ansible_playbook"
+            )
+            session.increment_metric("tokens_used", estimate_tokens(prompt))
             
-            return playbook_content
+            # Strip code fences and ensure the document starts with ---
+            return await clean_response_async(response_text, yaml_document=True)
             
         except Exception as e:
             logger.error(f"AI playbook generation failed: {str(e)}")
@@ -176,17 +312,18 @@ Start with:
     def _generate_playbook_template(self, parsed_spec: Dict[str, Any]) -> str:
         """Fallback template-based playbook generation"""
         
-        playbook = {
+        tasks: List[Dict[str, Any]] = []
+        playbook: Dict[str, Any] = {
             "name": parsed_spec['description'],
             "hosts": "all",
             "gather_facts": True,
             "become": False,
             "vars": parsed_spec.get('variables', {}),
-            "tasks": []
+            "tasks": tasks
         }
         
         # Add pre-flight checks
-        playbook["tasks"].append({
+        tasks.append({
             "name": "Pre-flight validation",
             "assert": {
                 "that": [
@@ -200,13 +337,13 @@ Start with:
         
         # Convert spec tasks to Ansible tasks
         for idx, task in enumerate(parsed_spec.get('tasks', [])):
-            ansible_task = {
+            ansible_task: Dict[str, Any] = {
                 "name": task.get('name', f"Task {idx+1}"),
                 "tags": parsed_spec.get('tags', [])
             }
             
             # Add the action
-            action = task.get('action', 'command')
+            action: str = task.get('action', 'command')
             if 'commands' in task:
                 ansible_task[action] = {
                     "commands": task['commands']
@@ -220,66 +357,57 @@ Start with:
             if 'register' in task:
                 ansible_task['register'] = task['register']
             
-            playbook["tasks"].append(ansible_task)
+            tasks.append(ansible_task)
         
-        return "---\n" + yaml.dump([playbook], default_flow_style=False)
+        return "---\n" + _dump_yaml([playbook])
     
     def _generate_inventory(self, parsed_spec: Dict[str, Any]) -> str:
         """Generate Ansible inventory file"""
         
-        inventory = {
-            "all": {
-                "children": {}
-            }
-        }
-        
-        # Group devices by type
-        device_groups = {}
+        # Group devices by type. The first device of a type sets the group
+        # vars; host numbering restarts for every device, so repeated types
+        # overlap and a group holds as many hosts as its largest count.
+        group_vars: Dict[Any, Dict[str, Any]] = {}
+        host_counts: Dict[Any, int] = {}
         for device in parsed_spec.get('target_devices', []):
             device_type = device.get('type', 'unknown')
-            if device_type not in device_groups:
-                device_groups[device_type] = {
-                    "hosts": {},
-                    "vars": {
-                        "ansible_network_os": device_type,
-                        "ansible_connection": device.get('connection', 'network_cli')
-                    }
-                }
-            
-            # Add host entries
-            count = device.get('count', 1)
-            for i in range(count):
-                host_name = f"{device_type}-{i+1:03d}"
-                device_groups[device_type]["hosts"][host_name] = {
-                    "ansible_host": f"192.168.1.{i+1}"
+            if device_type not in group_vars:
+                group_vars[device_type] = {
+                    "ansible_network_os": device_type,
+                    "ansible_connection": device.get('connection', 'network_cli')
                 }
+            host_counts[device_type] = max(
+                host_counts.get(device_type, 0), device.get('count', 1)
+            )
         
-        inventory["all"]["children"] = device_groups
+        # Build each group's hosts in a single pass
+        device_groups: Dict[Any, Dict[str, Any]] = {
+            device_type: {
+                "hosts": {
+                    "%s-%03d" % (device_type, i): {"ansible_host": "192.168.1.%d" % i}
+                    for i in range(1, host_counts[device_type] + 1)
+                },
+                "vars": group_vars[device_type]
+            }
+            for device_type in group_vars
+        }
         
-        return yaml.dump(inventory, default_flow_style=False)
+        content = _write_inventory(device_groups)
+        if content is not None:
+            return content
+        
+        inventory: Dict[str, Any] = {
+            "all": {
+                "children": device_groups
+            }
+        }
+        
+        return _dump_yaml(inventory)
     
     def _generate_ansible_cfg(self, parsed_spec: Dict[str, Any]) -> str:
         """Generate ansible.cfg file"""
         
-        config = """[defaults]
-inventory = inventory/hosts.yml
-host_key_checking = False
-retry_files_enabled = False
-gathering = smart
-fact_caching = jsonfile
-fact_caching_connection = /tmp/ansible_facts
-fact_caching_timeout = 86400
-stdout_callback = yaml
-callbacks_enabled = profile_tasks, timer
-
-[privilege_escalation]
-become = False
-
-[ssh_connection]
-pipelining = True
-ssh_args = -o ControlMaster=auto -o ControlPersist=60s
-"""
-        return config
+        return _ANSIBLE_CFG
     
     async def refine_playbook(
         self,
@@ -293,36 +421,31 @@ ssh_args = -o ControlMaster=auto -o ControlPersist=60s
         logger.info(f"Refining playbook: {playbook_path}")
         
         # Read current playbook
-        with open(playbook_path, 'r') as f:
-            current_content = f.read()
+        current_content = await read_text(playbook_path)
         
-        prompt = f"""
-You are an expert Ansible developer. Refine this Ansible playbook based on the feedback:
-
-Current Playbook:
-{current_content}
-
+        prompt = REFINE_SYSTEM_PROMPT + f"""
 Refinement Instructions:
 {refinement_prompt}
 
-Generate the improved playbook. Output ONLY the YAML content, no explanations.
+Current Playbook:
+{current_content}
 """
         
         try:
-            response = await self.model.generate_content_async(prompt)
-            session.increment_metric("tokens_used", len(prompt.split()))
+            response_text = await cached_generate(
+                self.model,
+                prompt,
+                "ansible_refinement"
+            )
+            session.increment_metric("tokens_used", estimate_tokens(prompt))
             session.increment_metric("refinements")
             
             # Clean the response
-            refined_content = response.text.strip()
-            if refined_content.startswith("```"):
-                lines = refined_content.split("\n")
-                refined_content = "\n".join(lines[1:-1])
+            refined_content = await clean_response_async(response_text)
             
             # Write refined version
             refined_path = playbook_path.replace(".yml", "_refined.yml")
-            with open(refined_path, 'w') as f:
-                f.write(refined_content)
+            await write_text(refined_path, refined_content)
             
             logger.info(f"Refined playbook saved: {refined_path}")
             
@@ -0,0 +1,46 @@
+"""
+Artifact Bundle
+Runs the generation agents for a specification as one unit
+"""
+
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, Any
+
+from agents.documentation_agent import DocumentationAgent
+from agents.test_generator import TestGeneratorAgent
+
+
+async def generate_bundle(
+    parsed_spec: Dict[str, Any],
+    session: Any,
+    ansible_agent: Any,
+    test_agent: TestGeneratorAgent,
+    doc_agent: DocumentationAgent
+) -> Dict[str, Any]:
+    """
+    Generate the playbook, documentation and tests for a specification.
+    
+    The playbook and documentation LLM calls have no data dependency and run
+    concurrently; test generation follows once the playbook is on disk.
+    The bundle's artifacts share one generated_at timestamp.
+    """
+    
+    generated_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    
+    playbook_result, doc_result = await asyncio.gather(
+        ansible_agent.generate_playbook(parsed_spec, session, generated_at),
+        doc_agent.generate_documentation(parsed_spec, session)
+    )
+    
+    test_result = await test_agent.generate_tests(
+        playbook_result["file_path"],
+        parsed_spec,
+        session
+    )
+    
+    return {
+        "ansible_playbook": playbook_result,
+        "documentation": doc_result,
+        "tests": test_result
+    }
@@ -0,0 +1,249 @@
+"""
+CI/CD Agent
+Generates CI/CD pipeline configurations for Ansible playbooks
+"""
+
+import os
+import functools
+import logging
+from typing import Dict, Any
+
+from agents._fsutil import ensure_dir, make_dirs, write_text
+
+logger = logging.getLogger(__name__)
+
+
+_GITHUB_ACTIONS_TEMPLATE = """name: Ansible CI/CD
+
+on:
+  push:
+    branches: [ main, develop ]
+  pull_request:
+    branches: [ main ]
+
+jobs:
+  lint:
+    runs-on: ubuntu-latest
+    steps:
+      - uses: actions/checkout@v3
+      
+      - name: Set up Python
+        uses: actions/setup-python@v4
+        with:
+          python-version: '3.10'
+      
+      - name: Install dependencies
+        run: |
+          pip install ansible ansible-lint yamllint
+      
+      - name: Run ansible-lint
+        run: ansible-lint {playbook}
+      
+      - name: Run yamllint
+        run: yamllint {playbook}
+  
+  test:
+    needs: lint
+    runs-on: ubuntu-latest
+    steps:
+      - uses: actions/checkout@v3
+      
+      - name: Set up Python
+        uses: actions/setup-python@v4
+        with:
+          python-version: '3.10'
+      
+      - name: Install dependencies
+        run: |
+          pip install ansible molecule molecule-docker pytest
+      
+      - name: Run molecule tests
+        run: |
+          cd {tests}
+          molecule test
+      
+      - name: Run pytest
+        run: pytest {tests}
+  
+  deploy:
+    needs: test
+    if: github.ref == 'refs/heads/main'
+    runs-on: ubuntu-latest
+    steps:
+      - uses: actions/checkout@v3
+      
+      - name: Run Ansible Playbook
+        run: |
+          ansible-playbook {playbook} --check
+"""
+
+_GITLAB_CI_TEMPLATE = """stages:
+  - lint
+  - test
+  - deploy
+
+variables:
+  PIP_CACHE_DIR: "$CI_PROJECT_DIR/.cache/pip"
+
+cache:
+  paths:
+    - .cache/pip
+
+lint:
+  stage: lint
+  image: python:3.10
+  script:
+    - pip install ansible ansible-lint yamllint
+    - ansible-lint {playbook}
+    - yamllint {playbook}
+
+test:
+  stage: test
+  image: python:3.10
+  services:
+    - docker:dind
+  script:
+    - pip install ansible molecule molecule-docker pytest
+    - cd {tests}
+    - molecule test
+
+deploy:
+  stage: deploy
+  image: python:3.10
+  script:
+    - ansible-playbook {playbook} --check
+  only:
+    - main
+"""
+
+_JENKINS_TEMPLATE = """pipeline {{
+    agent any
+    
+    stages {{
+        stage('Lint') {{
+            steps {{
+                sh 'pip install ansible ansible-lint yamllint'
+                sh 'ansible-lint {playbook}'
+                sh 'yamllint {playbook}'
+            }}
+        }}
+        
+        stage('Test') {{
+            steps {{
+                sh 'pip install molecule molecule-docker pytest'
+                sh 'cd {tests} && molecule test'
+                sh 'pytest {tests}'
+            }}
+        }}
+        
+        stage('Deploy') {{
+            when {{
+                branch 'main'
+            }}
+            steps {{
+                sh 'ansible-playbook {playbook} --check'
+            }}
+        }}
+    }}
+}}
+"""
+
+
+@functools.lru_cache(maxsize=128)
+def _render_pipeline(template: str, playbook: str, tests: str) -> str:
+    """
+    Fill a pipeline template with the playbook and tests paths.
+    
+    Results are memoized, since similar specs in one run usually point
+    at the same artifact paths.
+    """
+    return template.format(playbook=playbook, tests=tests)
+
+
+def _pipeline_content(template: str, artifacts: Dict[str, str]) -> str:
+    """Render a pipeline template for the given artifacts"""
+    return _render_pipeline(
+        template,
+        artifacts.get('ansible_playbook', 'playbook.yml'),
+        artifacts.get('tests', 'tests/')
+    )
+
+
+class CICDAgent:
+    """Generate CI/CD pipeline configurations"""
+    
+    def __init__(self, model):
+        self.model = model
+        self.output_dir = "./output/cicd"
+        ensure_dir(self.output_dir)
+    
+    async def generate_pipeline(
+        self,
+        parsed_spec: Dict[str, Any],
+        artifacts: Dict[str, str],
+        session: Any
+    ) -> Dict[str, Any]:
+        """Generate CI/CD pipeline configuration"""
+        
+        logger.info("Generating CI/CD pipeline...")
+        session.increment_metric("agent_calls")
+        
+        cicd_config = parsed_spec.get('cicd', {})
+        platform = cicd_config.get('platform', 'github_actions')
+        
+        if platform == 'github_actions':
+            pipeline_content = self._generate_github_actions(
+                parsed_spec,
+                artifacts
+            )
+            pipeline_file = "ansible-ci.yml"
+            pipeline_dir = os.path.join(self.output_dir, ".github", "workflows")
+        elif platform == 'gitlab_ci':
+            pipeline_content = self._generate_gitlab_ci(parsed_spec, artifacts)
+            pipeline_file = ".gitlab-ci.yml"
+            pipeline_dir = self.output_dir
+        else:
+            pipeline_content = self._generate_jenkins(parsed_spec, artifacts)
+            pipeline_file = "Jenkinsfile"
+            pipeline_dir = self.output_dir
+        
+        await make_dirs(pipeline_dir)
+        pipeline_path = os.path.join(pipeline_dir, pipeline_file)
+        
+        await write_text(pipeline_path, pipeline_content)
+        
+        logger.info(f"CI/CD pipeline generated: {pipeline_path}")
+        session.increment_metric("artifacts")
+        
+        return {
+            "success": True,
+            "pipeline_path": pipeline_path,
+            "platform": platform
+        }
+    
+    def _generate_github_actions(
+        self,
+        parsed_spec: Dict[str, Any],
+        artifacts: Dict[str, str]
+    ) -> str:
+        """Generate GitHub Actions workflow"""
+        
+        return _pipeline_content(_GITHUB_ACTIONS_TEMPLATE, artifacts)
+    
+    def _generate_gitlab_ci(
+        self,
+        parsed_spec: Dict[str, Any],
+        artifacts: Dict[str, str]
+    ) -> str:
+        """Generate GitLab CI configuration"""
+        
+        return _pipeline_content(_GITLAB_CI_TEMPLATE, artifacts)
+    
+    def _generate_jenkins(
+        self,
+        parsed_spec: Dict[str, Any],
+        artifacts: Dict[str, str]
+    ) -> str:
+        """Generate Jenkinsfile"""
+        
+        return _pipeline_content(_JENKINS_TEMPLATE, artifacts)
@@ -4,14 +4,106 @@ Performs comprehensive code review of generated Ansible playbooks
 """
 
 import os
+import re
+import json
+import asyncio
 import logging
 import yaml
-import subprocess
-from typing import Dict, Any, List
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Any, List, NamedTuple, Optional, Set, Tuple
 from datetime import datetime
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+from agents._fsutil import ensure_dir, read_text, write_text
+from agents._tokens import estimate_tokens
+
 logger = logging.getLogger(__name__)
 
+# Runs of whitespace, collapsed when comparing issue messages
+_WHITESPACE = re.compile(r"\s+")
+
+# Issue severities, most severe first
+_SEVERITY_LEVELS = ("critical", "high", "medium", "low")
+
+# ansible-lint time budget per playbook; a batch run gets one per file
+LINT_TIMEOUT_PER_FILE = 30
+
+# Code Climate severities reported by ansible-lint, mapped onto ours
+_LINT_SEVERITIES = {
+    "blocker": "critical",
+    "critical": "critical",
+    "major": "high",
+    "minor": "medium",
+    "info": "low"
+}
+
+# Common security issues as (pattern, message, severity); patterns are
+# matched case-insensitively
+_SECURITY_RULES: Tuple[Tuple[str, str, str], ...] = (
+    ("password:", "Hardcoded password detected", "critical"),
+    ("secret:", "Hardcoded secret detected", "critical"),
+    ("api_key:", "Hardcoded API key detected", "critical"),
+    ("no_log: false", "Sensitive data may be logged", "high"),
+    ("become: true", "Privilege escalation used - ensure necessary", "medium"),
+    ("shell:", "Shell module used - prefer specific modules", "medium"),
+)
+
+# All patterns in one alternation; group p<i> marks a hit for rule i
+_SECURITY_PATTERN = re.compile(
+    "|".join(
+        f"(?P<p{idx}>{re.escape(pattern)})"
+        for idx, (pattern, _, _) in enumerate(_SECURITY_RULES)
+    ),
+    re.IGNORECASE
+)
+
+# Static parts of the AI review prompt; only the playbook goes in between
+CODE_REVIEW_SYSTEM_PROMPT = """
+You are an expert Ansible code reviewer. Review this playbook for:
+
+1. Best practices compliance
+2. Code quality and maintainability
+3. Performance considerations
+4. Error handling
+5. Idempotency
+6. Documentation quality
+
+Playbook:
+"""
+
+CODE_REVIEW_FORMAT_PROMPT = """
+
+Provide your review in this format:
+ISSUES:
+- [SEVERITY: critical/high/medium/low] Issue description (line X if applicable)
+
+RECOMMENDATIONS:
+- Suggestion for improvement
+
+SCORE: X/5.0 (overall quality score)
+
+Be thorough but concise.
+"""
+
+
+class Issue(NamedTuple):
+    """A single review finding"""
+    type: str
+    severity: str
+    message: str
+    line: Optional[int] = None
+    pattern: Optional[str] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain dict form for results returned to callers"""
+        return {k: v for k, v in self._asdict().items() if v is not None}
+
 
 class CodeReviewAgent:
     """
@@ -29,17 +121,21 @@ class CodeReviewAgent:
         """Initialize with Gemini model"""
         self.model = model
         self.output_dir = "./output/reviews"
-        os.makedirs(self.output_dir, exist_ok=True)
+        ensure_dir(self.output_dir)
     
     async def review_code(
         self,
         playbook_path: str,
         parsed_spec: Dict[str, Any],
-        session: Any
+        session: Any,
+        run_lint: bool = True
     ) -> Dict[str, Any]:
         """
         Perform comprehensive code review of the playbook.
         
+        With run_lint=False the ansible-lint pass is skipped, for callers
+        that lint several playbooks together via lint_playbooks().
+        
         Returns:
             Dictionary with review results and report path
         """
@@ -48,10 +144,22 @@ class CodeReviewAgent:
         session.increment_metric("agent_calls")
         
         try:
-            # Run multiple review checks
-            lint_results = await self._run_ansible_lint(playbook_path)
-            security_results = await self._security_scan(playbook_path, session)
-            ai_review = await self._ai_code_review(playbook_path, session)
+            # Read once; the security scan and the AI review share the text
+            content = await read_text(playbook_path)
+            
+            # Run the independent review checks concurrently, overlapping
+            # the lint subprocess with the model call
+            checks = [
+                self._security_scan(content, session),
+                self._ai_code_review(content, session)
+            ]
+            if run_lint:
+                checks.append(self._run_ansible_lint(playbook_path))
+            
+            results = await asyncio.gather(*checks, return_exceptions=True)
+            security_results = self._check_result(results[0], "security")
+            ai_review = self._check_result(results[1], "ai_review")
+            lint_results = self._check_result(results[2], "lint") if run_lint else {}
             
             # Aggregate results
             all_issues = []
@@ -59,11 +167,15 @@ class CodeReviewAgent:
             all_issues.extend(security_results.get("issues", []))
             all_issues.extend(ai_review.get("issues", []))
             
-            # Calculate severity counts
-            critical_issues = len([i for i in all_issues if i.get("severity") == "critical"])
-            high_issues = len([i for i in all_issues if i.get("severity") == "high"])
-            medium_issues = len([i for i in all_issues if i.get("severity") == "medium"])
-            low_issues = len([i for i in all_issues if i.get("severity") == "low"])
+            # Drop findings reported by more than one check
+            all_issues = self._deduplicate_issues(all_issues)
+            
+            # Calculate severity counts in one pass
+            severity_counts = Counter(i.severity for i in all_issues)
+            critical_issues = severity_counts["critical"]
+            high_issues = severity_counts["high"]
+            medium_issues = severity_counts["medium"]
+            low_issues = severity_counts["low"]
             
             # Calculate quality score
             quality_score = self._calculate_quality_score(
@@ -77,6 +189,7 @@ class CodeReviewAgent:
             report_path = await self._generate_review_report(
                 playbook_path,
                 all_issues,
+                severity_counts,
                 quality_score,
                 {
                     "lint": lint_results,
@@ -92,7 +205,7 @@ class CodeReviewAgent:
                 "success": True,
                 "report_path": report_path,
                 "quality_score": quality_score,
-                "issues": all_issues,
+                "issues": [i.to_dict() for i in all_issues],
                 "critical_issues": critical_issues,
                 "high_issues": high_issues,
                 "medium_issues": medium_issues,
@@ -105,118 +218,191 @@ class CodeReviewAgent:
             logger.error(f"Code review failed: {str(e)}", exc_info=True)
             raise
     
+    async def quick_review(self, playbook_path: str, session: Any) -> Dict[str, Any]:
+        """
+        Security-only re-check for refinement loops.
+        
+        Skips ansible-lint and the AI review, so it costs no model call;
+        run review_code() once the loop is done for the full picture.
+        """
+        
+        content = await read_text(playbook_path)
+        security_results = await self._security_scan(content, session)
+        issues = security_results["issues"]
+        
+        return {
+            "issues": [i.to_dict() for i in issues],
+            "critical_issues": sum(1 for i in issues if i.severity == "critical"),
+            "passed": security_results["passed"]
+        }
+    
+    def _check_result(self, result: Any, check_type: str) -> Dict[str, Any]:
+        """Turn an exception raised by a review check into a failed result"""
+        
+        if not isinstance(result, Exception):
+            return result
+        
+        logger.error(f"{check_type} check failed: {str(result)}")
+        return {
+            "passed": False,
+            "issues": [Issue(
+                check_type,
+                "low",
+                f"{check_type} check failed: {str(result)}"
+            )]
+        }
+    
+    async def lint_playbooks(self, playbook_paths: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Lint several playbooks with a single ansible-lint run.
+        
+        Returns lint results keyed by playbook path.
+        """
+        
+        results = await self._run_ansible_lint_batch(playbook_paths)
+        return {
+            path: {**result, "issues": [i.to_dict() for i in result["issues"]]}
+            for path, result in results.items()
+        }
+    
     async def _run_ansible_lint(self, playbook_path: str) -> Dict[str, Any]:
         """Run ansible-lint on the playbook"""
         
-        logger.info("Running ansible-lint...")
+        results = await self._run_ansible_lint_batch([playbook_path])
+        return results[playbook_path]
+    
+    async def _run_ansible_lint_batch(
+        self,
+        playbook_paths: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Run ansible-lint once over all playbooks and split issues per file.
+        
+        Uses the JSON (Code Climate) report so every finding carries its
+        file, line and severity; this pays ansible-lint's startup cost once
+        instead of once per file.
+        """
+        
+        logger.info(f"Running ansible-lint on {len(playbook_paths)} playbook(s)...")
+        
+        if not playbook_paths:
+            return {}
+        
+        timeout = LINT_TIMEOUT_PER_FILE * len(playbook_paths)
         
         try:
-            result = subprocess.run(
-                ["ansible-lint", "--nocolor", playbook_path],
-                capture_output=True,
-                text=True,
-                timeout=30
+            proc = await asyncio.create_subprocess_exec(
+                "ansible-lint", "--nocolor", "--offline", "-f", "json",
+                *playbook_paths,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
             )
+            try:
+                stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                raise RuntimeError(f"ansible-lint timed out after {timeout} seconds")
+            
+            output = stdout.decode("utf-8", errors="replace")
+            issues = {path: [] for path in playbook_paths}
             
-            issues = []
+            # ansible-lint may report paths relative to the working directory
+            path_lookup = {}
+            for path in playbook_paths:
+                path_lookup[path] = path
+                path_lookup[os.path.normpath(path)] = path
+                path_lookup[os.path.relpath(path)] = path
+                path_lookup[os.path.abspath(path)] = path
             
-            # Parse lint output
-            if result.returncode != 0:
-                for line in result.stdout.split("\n"):
-                    if line.strip() and not line.startswith("WARNING"):
-                        issues.append({
-                            "type": "lint",
-                            "severity": "medium",
-                            "message": line.strip(),
-                            "line": None
-                        })
+            # Findings in files outside the batch (e.g. included task files)
+            unmatched = 0
+            
+            # Parse lint output straight from the raw bytes
+            for item in _json_loads(stdout) if stdout.strip() else []:
+                location = item.get("location", {})
+                path = path_lookup.get(location.get("path"))
+                if path is None:
+                    if len(playbook_paths) > 1:
+                        unmatched += 1
+                        continue
+                    path = playbook_paths[0]
+                
+                # Newer releases give positions instead of a line range
+                line = location.get("lines", {}).get("begin")
+                if line is None:
+                    line = location.get("positions", {}).get("begin", {}).get("line")
+                
+                issues[path].append(Issue(
+                    "lint",
+                    _LINT_SEVERITIES.get(item.get("severity"), "medium"),
+                    f"{item.get('check_name', 'lint')}: {item.get('description', '')}",
+                    line=line
+                ))
+            
+            # Without a file to pin them on, unmatched findings fail the
+            # playbooks that would otherwise pass
+            if unmatched and proc.returncode != 0:
+                logger.warning(
+                    f"{unmatched} ansible-lint finding(s) matched no playbook in the batch"
+                )
             
             return {
-                "passed": result.returncode == 0,
-                "issues": issues,
-                "output": result.stdout
+                path: {
+                    "passed": proc.returncode == 0 or (not issues[path] and not unmatched),
+                    "issues": issues[path],
+                    "output": output
+                }
+                for path in playbook_paths
             }
             
         except FileNotFoundError:
             logger.warning("ansible-lint not found, skipping")
             return {
-                "passed": True,
-                "issues": [],
-                "output": "ansible-lint not available"
+                path: {
+                    "passed": True,
+                    "issues": [],
+                    "output": "ansible-lint not available"
+                }
+                for path in playbook_paths
             }
         except Exception as e:
             logger.warning(f"ansible-lint failed: {str(e)}")
             return {
-                "passed": False,
-                "issues": [{
-                    "type": "lint",
-                    "severity": "low",
-                    "message": f"Lint check failed: {str(e)}",
-                    "line": None
-                }],
-                "output": str(e)
+                path: {
+                    "passed": False,
+                    "issues": [Issue("lint", "low", f"Lint check failed: {str(e)}")],
+                    "output": str(e)
+                }
+                for path in playbook_paths
             }
     
     async def _security_scan(
         self,
-        playbook_path: str,
+        content: str,
         session: Any
     ) -> Dict[str, Any]:
-        """Scan for security vulnerabilities"""
+        """Scan playbook content for security vulnerabilities"""
         
         logger.info("Running security scan...")
         
         issues = []
         
         try:
-            with open(playbook_path, 'r') as f:
-                content = f.read()
+            # Check for common security issues in one case-insensitive pass
+            # over the original buffer, stopping once every check has hit
+            found = set()
+            for match in _SECURITY_PATTERN.finditer(content):
+                found.add(match.lastgroup)
+                if len(found) == len(_SECURITY_RULES):
+                    break
             
-            # Check for common security issues
-            security_checks = [
-                {
-                    "pattern": "password:",
-                    "message": "Hardcoded password detected",
-                    "severity": "critical"
-                },
-                {
-                    "pattern": "secret:",
-                    "message": "Hardcoded secret detected",
-                    "severity": "critical"
-                },
-                {
-                    "pattern": "api_key:",
-                    "message": "Hardcoded API key detected",
-                    "severity": "critical"
-                },
-                {
-                    "pattern": "no_log: false",
-                    "message": "Sensitive data may be logged",
-                    "severity": "high"
-                },
-                {
-                    "pattern": "become: true",
-                    "message": "Privilege escalation used - ensure necessary",
-                    "severity": "medium"
-                },
-                {
-                    "pattern": "shell:",
-                    "message": "Shell module used - prefer specific modules",
-                    "severity": "medium"
-                }
-            ]
-            
-            for check in security_checks:
-                if check["pattern"] in content.lower():
-                    issues.append({
-                        "type": "security",
-                        "severity": check["severity"],
-                        "message": check["message"],
-                        "pattern": check["pattern"]
-                    })
+            for idx, (pattern, message, severity) in enumerate(_SECURITY_RULES):
+                if f"p{idx}" in found:
+                    issues.append(Issue("security", severity, message, pattern=pattern))
             
             return {
-                "passed": len([i for i in issues if i["severity"] == "critical"]) == 0,
+                "passed": all(i.severity != "critical" for i in issues),
                 "issues": issues
             }
             
@@ -224,16 +410,12 @@ class CodeReviewAgent:
             logger.error(f"Security scan failed: {str(e)}")
             return {
                 "passed": False,
-                "issues": [{
-                    "type": "security",
-                    "severity": "low",
-                    "message": f"Security scan failed: {str(e)}"
-                }]
+                "issues": [Issue("security", "low", f"Security scan failed: {str(e)}")]
             }
     
     async def _ai_code_review(
         self,
-        playbook_path: str,
+        playbook_content: str,
         session: Any
     ) -> Dict[str, Any]:
         """Use AI to perform intelligent code review"""
@@ -241,36 +423,10 @@ class CodeReviewAgent:
         logger.info("Running AI code review...")
         
         try:
-            with open(playbook_path, 'r') as f:
-                playbook_content = f.read()
-            
-            prompt = f"""
-You are an expert Ansible code reviewer. Review this playbook for:
-
-1. Best practices compliance
-2. Code quality and maintainability
-3. Performance considerations
-4. Error handling
-5. Idempotency
-6. Documentation quality
-
-Playbook:
-{playbook_content}
-
-Provide your review in this format:
-ISSUES:
-- [SEVERITY: critical/high/medium/low] Issue description (line X if applicable)
-
-RECOMMENDATIONS:
-- Suggestion for improvement
-
-SCORE: X/5.0 (overall quality score)
-
-Be thorough but concise.
-"""
+            prompt = CODE_REVIEW_SYSTEM_PROMPT + playbook_content + CODE_REVIEW_FORMAT_PROMPT
             
             response = await self.model.generate_content_async(prompt)
-            session.increment_metric("tokens_used", len(prompt.split()))
+            session.increment_metric("tokens_used", estimate_tokens(prompt))
             
             # Parse AI response for issues
             issues = self._parse_ai_review_response(response.text)
@@ -289,35 +445,67 @@ Be thorough but concise.
                 "full_review": f"AI review failed: {str(e)}"
             }
     
-    def _parse_ai_review_response(self, review_text: str) -> List[Dict[str, Any]]:
+    def _parse_ai_review_response(self, review_text: str) -> List[Issue]:
         """Parse AI review response to extract issues"""
         
         issues = []
         
-        if "ISSUES:" in review_text:
-            issues_section = review_text.split("ISSUES:")[1].split("RECOMMENDATIONS:")[0]
+        # Slice out the ISSUES section once instead of splitting the full text
+        start = review_text.find("ISSUES:")
+        if start == -1:
+            return issues
+        start += len("ISSUES:")
+        
+        # The section ends at RECOMMENDATIONS: or at a repeated ISSUES: header
+        end = len(review_text)
+        for marker in ("ISSUES:", "RECOMMENDATIONS:"):
+            pos = review_text.find(marker, start, end)
+            if pos != -1:
+                end = pos
+        issues_section = review_text[start:end]
+        
+        for line in issues_section.splitlines():
+            line = line.strip()
+            if not line.startswith("-"):
+                continue
+            
+            lowered = line.lower()
+            if "severity:" not in lowered:
+                continue
             
-            for line in issues_section.split("\n"):
-                line = line.strip()
-                if line.startswith("-") and "SEVERITY:" in line.upper():
-                    # Extract severity
-                    severity = "medium"  # default
-                    for sev in ["critical", "high", "medium", "low"]:
-                        if sev in line.lower():
-                            severity = sev
-                            break
-                    
-                    # Extract message
-                    message = line.split("]", 1)[1].strip() if "]" in line else line[1:].strip()
-                    
-                    issues.append({
-                        "type": "ai_review",
-                        "severity": severity,
-                        "message": message
-                    })
+            # Extract severity; the first level named wins, medium by default
+            severity = next(
+                (sev for sev in _SEVERITY_LEVELS if sev in lowered),
+                "medium"
+            )
+            
+            # Extract message
+            message = line.split("]", 1)[1].strip() if "]" in line else line[1:].strip()
+            
+            issues.append(Issue("ai_review", severity, message))
         
         return issues
     
+    def _deduplicate_issues(self, issues: List[Issue]) -> List[Issue]:
+        """
+        Drop findings already reported by a different check.
+        
+        Issues match on severity and message, compared case- and
+        whitespace-insensitively on the first 80 characters. Repeats from
+        the same check (e.g. one lint rule on several lines) are all kept.
+        """
+        
+        seen: Dict[Tuple[str, str], Set[str]] = {}
+        unique = []
+        for issue in issues:
+            key = (issue.severity, _WHITESPACE.sub(" ", issue.message.lower())[:80])
+            types = seen.setdefault(key, set())
+            if types and issue.type not in types:
+                continue
+            types.add(issue.type)
+            unique.append(issue)
+        return unique
+    
     def _calculate_quality_score(
         self,
         critical: int,
@@ -342,75 +530,83 @@ Be thorough but concise.
     async def _generate_review_report(
         self,
         playbook_path: str,
-        issues: List[Dict[str, Any]],
+        issues: List[Issue],
+        severity_counts: Counter,
         quality_score: float,
         detailed_results: Dict[str, Any]
     ) -> str:
         """Generate comprehensive review report"""
         
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        playbook_name = os.path.basename(playbook_path).replace(".yml", "")
+        # One clock read for the file name and the report header
+        now = datetime.now()
+        timestamp = now.strftime("%Y%m%d_%H%M%S")
+        playbook_name = Path(playbook_path).stem
         report_path = os.path.join(
             self.output_dir,
             f"{playbook_name}_review_{timestamp}.md"
         )
         
         # Build report content
-        report = f"""# Code Review Report
+        parts = [f"""# Code Review Report
 
 **Playbook**: `{os.path.basename(playbook_path)}`  
-**Review Date**: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}  
+**Review Date**: {now.strftime("%Y-%m-%d %H:%M:%S")}  
 **Quality Score**: {quality_score:.2f}/5.0
 
 ## Summary
 
 - **Total Issues**: {len(issues)}
-- **Critical**: {len([i for i in issues if i.get("severity") == "critical"])}
-- **High**: {len([i for i in issues if i.get("severity") == "high"])}
-- **Medium**: {len([i for i in issues if i.get("severity") == "medium"])}
-- **Low**: {len([i for i in issues if i.get("severity") == "low"])}
+- **Critical**: {severity_counts["critical"]}
+- **High**: {severity_counts["high"]}
+- **Medium**: {severity_counts["medium"]}
+- **Low**: {severity_counts["low"]}
 
 ## Overall Assessment
 
-"""
+"""]
         
         if quality_score >= 4.5:
-            report += "✅ **EXCELLENT** - Playbook meets all best practices\n\n"
+            parts.append("✅ **EXCELLENT** - Playbook meets all best practices\n\n")
         elif quality_score >= 3.5:
-            report += "✓ **GOOD** - Playbook is production-ready with minor improvements suggested\n\n"
+            parts.append("✓ **GOOD** - Playbook is production-ready with minor improvements suggested\n\n")
         elif quality_score >= 2.5:
-            report += "⚠️ **NEEDS IMPROVEMENT** - Address issues before production use\n\n"
+            parts.append("⚠️ **NEEDS IMPROVEMENT** - Address issues before production use\n\n")
         else:
-            report += "❌ **CRITICAL ISSUES** - Major refactoring required\n\n"
+            parts.append("❌ **CRITICAL ISSUES** - Major refactoring required\n\n")
+        
+        # Issues by severity, grouped in a single pass
+        issues_by_severity = defaultdict(list)
+        for issue in issues:
+            issues_by_severity[issue.severity].append(issue)
         
-        # Issues by severity
         for severity in ["critical", "high", "medium", "low"]:
-            severity_issues = [i for i in issues if i.get("severity") == severity]
+            severity_issues = issues_by_severity[severity]
             if severity_issues:
-                report += f"## {severity.upper()} Issues\n\n"
+                parts.append(f"## {severity.upper()} Issues\n\n")
                 for issue in severity_issues:
-                    report += f"- **[{issue.get('type', 'unknown')}]** {issue.get('message', 'No description')}\n"
-                report += "\n"
+                    parts.append(f"- **[{issue.type}]** {issue.message or 'No description'}\n")
+                parts.append("\n")
         
         # Detailed results
-        report += "## Detailed Analysis\n\n"
+        parts.append("## Detailed Analysis\n\n")
         
         if detailed_results.get("lint"):
-            report += "### Ansible Lint\n"
-            report += f"Status: {'✅ Passed' if detailed_results['lint']['passed'] else '❌ Failed'}\n\n"
+            parts.append("### Ansible Lint\n")
+            parts.append(f"Status: {'✅ Passed' if detailed_results['lint']['passed'] else '❌ Failed'}\n\n")
         
         if detailed_results.get("security"):
-            report += "### Security Scan\n"
-            report += f"Status: {'✅ Passed' if detailed_results['security']['passed'] else '⚠️ Issues Found'}\n\n"
+            parts.append("### Security Scan\n")
+            parts.append(f"Status: {'✅ Passed' if detailed_results['security']['passed'] else '⚠️ Issues Found'}\n\n")
         
         if detailed_results.get("ai_review", {}).get("full_review"):
-            report += "### AI Review\n\n"
-            report += detailed_results['ai_review']['full_review']
-            report += "\n\n"
+            parts.append("### AI Review\n\n")
+            parts.append(detailed_results['ai_review']['full_review'])
+            parts.append("\n\n")
+        
+        report = "".join(parts)
         
-        # Write report
-        with open(report_path, 'w') as f:
-            f.write(report)
+        # Write report; UTF-8 regardless of locale, since it contains emoji
+        await write_text(report_path, report, encoding="utf-8")
         
         logger.info(f"Review report generated: {report_path}")
         
@@ -0,0 +1,132 @@
+"""
+Documentation Agent
+Generates README and usage documentation for Ansible automations
+"""
+
+import os
+import logging
+from typing import Dict, Any
+
+from agents._fsutil import ensure_dir, write_text
+from agents._llm_cache import cached_generate
+from agents._tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Static instructions go first so that repeated prompts share a cacheable
+# prefix; the automation details are appended after them.
+README_SYSTEM_PROMPT = """
+Generate comprehensive README documentation for the Ansible automation described below.
+
+Include:
+1. Overview and purpose
+2. Requirements
+3. Installation instructions
+4. Usage examples
+5. Variables reference
+6. Testing instructions
+7. Troubleshooting
+8. Contributing guidelines
+
+Make it professional and well-structured in Markdown format.
+"""
+
+
+class DocumentationAgent:
+    """Generate comprehensive documentation"""
+    
+    def __init__(self, model):
+        self.model = model
+        self.output_dir = "./output/docs"
+        ensure_dir(self.output_dir)
+    
+    async def generate_documentation(
+        self,
+        parsed_spec: Dict[str, Any],
+        session: Any
+    ) -> Dict[str, Any]:
+        """Generate README and usage documentation"""
+        
+        logger.info("Generating documentation...")
+        session.increment_metric("agent_calls")
+        
+        # Use AI to generate comprehensive docs
+        doc_content = await self._generate_readme(parsed_spec, session)
+        
+        doc_path = os.path.join(
+            self.output_dir,
+            f"{parsed_spec['name']}_README.md"
+        )
+        
+        await write_text(doc_path, doc_content)
+        
+        logger.info(f"Documentation generated: {doc_path}")
+        session.increment_metric("artifacts")
+        
+        return {
+            "success": True,
+            "file_path": doc_path
+        }
+    
+    async def _generate_readme(
+        self,
+        parsed_spec: Dict[str, Any],
+        session: Any
+    ) -> str:
+        """Generate README content"""
+        
+        prompt = README_SYSTEM_PROMPT + f"""
+Name: {parsed_spec['name']}
+Description: {parsed_spec['description']}
+Target Devices: {len(parsed_spec.get('target_devices', []))} devices
+"""
+        
+        try:
+            response_text = await cached_generate(
+                self.model,
+                prompt,
+                "documentation"
+            )
+            session.increment_metric("tokens_used", estimate_tokens(prompt))
+            
+            return response_text.strip()
+            
+        except Exception as e:
+            logger.warning(f"AI documentation generation failed: {str(e)}")
+            return self._generate_basic_readme(parsed_spec)
+    
+    def _generate_basic_readme(self, parsed_spec: Dict[str, Any]) -> str:
+        """Fallback basic README"""
+        
+        return f"""# {parsed_spec['name']}
+
+## Description
+
+{parsed_spec['description']}
+
+## Requirements
+
+- Ansible >= 2.9
+- Python >= 3.8
+- Target devices: {len(parsed_spec.get('target_devices', []))}
+
+## Usage
+
+```bash
+ansible-playbook -i inventory/hosts.yml {parsed_spec['name']}.yml
+```
+
+## Testing
+
+```bash
+# Run molecule tests
+molecule test
+
+# Run pytest
+pytest tests/
+```
+
+## License
+
+MIT
+"""
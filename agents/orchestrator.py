@@ -7,8 +7,8 @@ import asyncio
 import logging
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass
-from datetime import datetime
-import json
+from datetime import datetime, timezone
+import difflib
 import os
 
 # Google AI imports
@@ -21,6 +21,7 @@ from agents.code_reviewer import CodeReviewAgent
 from agents.test_generator import TestGeneratorAgent
 from agents.cicd_agent import CICDAgent
 from agents.documentation_agent import DocumentationAgent
+from agents._fsutil import read_text
 from memory.session_manager import SessionManager
 from observability.logger import setup_logger
 from observability.metrics import MetricsCollector
@@ -69,7 +70,7 @@ class OrchestratorAgent:
         self.session_manager = SessionManager()
         
         # Initialize metrics collection
-        self.metrics = MetricsCollector()
+        self.metrics = MetricsCollector.instance()
         
         # Output directory setup
         self.output_base_dir = output_base_dir
@@ -96,7 +97,7 @@ class OrchestratorAgent:
         Implements multi-agent workflow:
         1. Parse specification (Sequential)
         2. Parallel execution: Generate documentation + Ansible playbook
-        3. Sequential pipeline: Review → Test → CI/CD
+        3. Pipeline: Review → (Test + CI/CD in parallel)
         """
         
         start_time = datetime.now()
@@ -125,13 +126,15 @@ class OrchestratorAgent:
             
             # PHASE 2: Parallel execution for independent tasks
             logger.info("Phase 2: Parallel generation (Documentation + Ansible)...")
+            generated_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
             doc_task = self.documentation_agent.generate_documentation(
                 parsed_spec, 
                 session
             )
             ansible_task = self.ansible_generator.generate_playbook(
                 parsed_spec,
-                session
+                session,
+                generated_at
             )
             
             # Execute in parallel
@@ -156,8 +159,8 @@ class OrchestratorAgent:
                 artifacts["inventory"] = ansible_result.get("inventory_path", "")
                 session.add_context("ansible_playbook", ansible_result)
             
-            # PHASE 3: Sequential pipeline (Review → Test → CI/CD)
-            logger.info("Phase 3: Sequential pipeline (Review → Test → CI/CD)...")
+            # PHASE 3: Pipeline (Review → Test + CI/CD)
+            logger.info("Phase 3: Pipeline (Review → Test + CI/CD)...")
             
             # Step 3a: Code Review
             review_result = await self.code_reviewer.review_code(
@@ -186,21 +189,27 @@ class OrchestratorAgent:
                     artifacts["ansible_playbook"] = refined_result["file_path"]
                     session.add_context("refined_playbook", refined_result)
             
-            # Step 3b: Test Generation
-            test_result = await self.test_generator.generate_tests(
-                artifacts["ansible_playbook"],
-                parsed_spec,
-                session
+            # Steps 3b + 3c: Test and CI/CD generation. The pipeline only
+            # needs the test directory, which is known from the final
+            # playbook path, so both run concurrently
+            artifacts["tests"] = self.test_generator.test_dir_for(
+                artifacts["ansible_playbook"]
+            )
+            test_result, cicd_result = await asyncio.gather(
+                self.test_generator.generate_tests(
+                    artifacts["ansible_playbook"],
+                    parsed_spec,
+                    session
+                ),
+                self.cicd_agent.generate_pipeline(
+                    parsed_spec,
+                    dict(artifacts),
+                    session
+                )
             )
             artifacts["tests"] = test_result["test_dir"]
             session.add_context("tests", test_result)
             
-            # Step 3c: CI/CD Pipeline Generation
-            cicd_result = await self.cicd_agent.generate_pipeline(
-                parsed_spec,
-                artifacts,
-                session
-            )
             artifacts["cicd_pipeline"] = cicd_result["pipeline_path"]
             session.add_context("cicd", cicd_result)
             
@@ -253,6 +262,8 @@ class OrchestratorAgent:
         
         iteration = 0
         current_playbook = ansible_result
+        refined_paths = []
+        prior_patch = ""
         
         while iteration < max_iterations:
             iteration += 1
@@ -261,7 +272,8 @@ class OrchestratorAgent:
             # Generate refinement instructions from review
             refinement_prompt = self._create_refinement_prompt(
                 review_result,
-                iteration
+                iteration,
+                prior_patch
             )
             
             # Re-generate with improvements
@@ -272,44 +284,121 @@ class OrchestratorAgent:
                 session
             )
             
-            # Re-review
-            new_review = await self.code_reviewer.review_code(
+            refined_paths.append(refined_result["file_path"])
+            
+            # Quick re-check without a model call; the full review and lint
+            # run once the loop is done
+            new_review = await self.code_reviewer.quick_review(
                 refined_result["file_path"],
-                parsed_spec,
                 session
             )
             
             # Check if improvement achieved
             if new_review.get("critical_issues", 0) == 0:
                 logger.info(f"Refinement successful after {iteration} iteration(s)")
+                await self._finalize_refinement(
+                    refined_result,
+                    refined_paths,
+                    parsed_spec,
+                    session
+                )
                 return refined_result
             
-            # Update for next iteration
+            # Update for next iteration; the next prompt shows what this
+            # attempt changed instead of the whole review history
+            prior_patch = await self._playbook_diff(
+                current_playbook["file_path"],
+                refined_result["file_path"]
+            )
             current_playbook = refined_result
             review_result = new_review
             
             # Context compaction to manage token usage
-            session.compact_context(keep_recent=3)
+            session.compact_context(keep_recent=1)
         
         logger.warning(f"Refinement loop completed without resolving all issues")
+        await self._finalize_refinement(
+            current_playbook,
+            refined_paths,
+            parsed_spec,
+            session
+        )
         return current_playbook
     
+    async def _finalize_refinement(
+        self,
+        final_playbook: Dict[str, Any],
+        refined_paths: List[str],
+        parsed_spec: Dict[str, Any],
+        session: Any
+    ):
+        """
+        Fully review the final playbook and lint every refined version.
+        
+        All refined versions go through a single ansible-lint run, so the
+        full review skips its own lint pass.
+        """
+        
+        if not refined_paths:
+            return
+        
+        final_review, lint_results = await asyncio.gather(
+            self.code_reviewer.review_code(
+                final_playbook["file_path"],
+                parsed_spec,
+                session,
+                run_lint=False
+            ),
+            self.code_reviewer.lint_playbooks(refined_paths)
+        )
+        session.add_context("refined_review", final_review)
+        session.add_context("refinement_lint", lint_results)
+    
+    async def _playbook_diff(self, previous_path: str, current_path: str) -> str:
+        """Unified diff between two playbook versions"""
+        
+        previous, current = await asyncio.gather(
+            read_text(previous_path),
+            read_text(current_path)
+        )
+        return "".join(difflib.unified_diff(
+            previous.splitlines(keepends=True),
+            current.splitlines(keepends=True),
+            fromfile=os.path.basename(previous_path),
+            tofile=os.path.basename(current_path),
+            n=2
+        ))
+    
     def _create_refinement_prompt(
         self,
         review_result: Dict[str, Any],
-        iteration: int
+        iteration: int,
+        prior_patch: str = ""
     ) -> str:
         """Create a targeted refinement prompt based on review findings"""
         
+        # Only the open critical issues, one line each and without repeats
         issues = review_result.get("issues", [])
-        critical_issues = [i for i in issues if i.get("severity") == "critical"]
+        critical_issues = "\n".join(dict.fromkeys(
+            f"- [{i.get('type', 'unknown')}] {i.get('message', '')}"
+            for i in issues if i.get("severity") == "critical"
+        ))
+        
+        patch_section = ""
+        if prior_patch:
+            patch_section = f"""
+Changes made in the previous iteration (they did not resolve the issues above):
+```diff
+{prior_patch.rstrip()}
+```
+"""
         
         prompt = f"""
 Refinement Iteration {iteration}:
 
 Critical Issues to Address:
-{json.dumps(critical_issues, indent=2)}
-
+{critical_issues}
+{patch_section}
 Please refine the Ansible playbook to:
 1. Fix all critical security and syntax issues
 2. Implement best practices for the identified problems
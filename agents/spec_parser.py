@@ -8,8 +8,53 @@ import logging
 from typing import Dict, Any
 from pathlib import Path
 
+from agents._fsutil import read_bytes
+from agents._llm_cache import cached_generate
+from agents._tokens import estimate_tokens
+
 logger = logging.getLogger(__name__)
 
+try:
+    from yaml import CSafeLoader as _Loader, CSafeDumper as _Dumper
+except ImportError:
+    from yaml import SafeLoader as _Loader, SafeDumper as _Dumper
+    logger.warning(
+        "PyYAML was built without libyaml; falling back to the pure-Python "
+        "loader (install libyaml-dev and reinstall PyYAML for faster parsing)"
+    )
+
+# Static instructions come first so every enrichment call shares an
+# identical prompt prefix; the specification YAML is appended after it.
+SPEC_ENRICHMENT_SYSTEM_PROMPT = """
+You are a network automation expert. Analyze the automation specification below and provide:
+
+1. Validation of device types and compatibility
+2. Suggestions for missing best practices
+3. Identification of potential issues
+4. Recommended additional parameters
+
+Provide your analysis in this format:
+- Valid: [yes/no]
+- Issues: [list any problems]
+- Recommendations: [list improvements]
+- Enriched Spec: [the specification with recommended additions]
+
+Focus on network automation best practices for Ansible.
+
+Specification:
+"""
+
+# Fields every automation_spec must define
+_REQUIRED_FIELDS = ("name", "description", "target_devices", "tasks")
+
+# (field, error when not a list, error when empty)
+_NON_EMPTY_LISTS = (
+    ("target_devices", "target_devices must be a list",
+     "At least one target device must be specified"),
+    ("tasks", "tasks must be a list",
+     "At least one task must be specified"),
+)
+
 
 class SpecificationParserAgent:
     """
@@ -48,9 +93,10 @@ class SpecificationParserAgent:
         session.increment_metric("agent_calls")
         
         try:
-            # Read YAML file
-            with open(spec_file, 'r') as f:
-                raw_spec = yaml.safe_load(f)
+            # Read YAML file as bytes; libyaml decodes UTF-8 itself, so
+            # skip a separate text decode pass
+            raw_bytes = await read_bytes(spec_file)
+            raw_spec = yaml.load(raw_bytes, Loader=_Loader)
             
             # Basic validation
             validation_result = self._validate_structure(raw_spec)
@@ -102,54 +148,37 @@ class SpecificationParserAgent:
     def _validate_structure(self, spec: Dict[str, Any]) -> Dict[str, Any]:
         """Validate that the specification has all required fields"""
         
-        missing_fields = []
-        
         # Check for automation_spec root
-        if "automation_spec" not in spec:
+        if not isinstance(spec, dict) or "automation_spec" not in spec:
             return {
                 "valid": False,
                 "error": "Missing 'automation_spec' root element"
             }
         
         automation_spec = spec["automation_spec"]
-        
-        # Check required fields
-        required = ["name", "description", "target_devices", "tasks"]
-        for field in required:
-            if field not in automation_spec:
-                missing_fields.append(field)
-        
-        if missing_fields:
+        if not isinstance(automation_spec, dict):
             return {
                 "valid": False,
-                "error": f"Missing required fields: {', '.join(missing_fields)}"
+                "error": "'automation_spec' must be a mapping"
             }
         
-        # Validate target devices
-        if not isinstance(automation_spec["target_devices"], list):
-            return {
-                "valid": False,
-                "error": "target_devices must be a list"
-            }
-        
-        if not automation_spec["target_devices"]:
-            return {
-                "valid": False,
-                "error": "At least one target device must be specified"
-            }
-        
-        # Validate tasks
-        if not isinstance(automation_spec["tasks"], list):
+        # Check required fields
+        missing_fields = [
+            field for field in _REQUIRED_FIELDS if field not in automation_spec
+        ]
+        if missing_fields:
             return {
                 "valid": False,
-                "error": "tasks must be a list"
+                "error": f"Missing required fields: {', '.join(missing_fields)}"
             }
         
-        if not automation_spec["tasks"]:
-            return {
-                "valid": False,
-                "error": "At least one task must be specified"
-            }
+        # Validate target devices and tasks
+        for field, type_error, empty_error in _NON_EMPTY_LISTS:
+            value = automation_spec[field]
+            if not isinstance(value, list):
+                return {"valid": False, "error": type_error}
+            if not value:
+                return {"valid": False, "error": empty_error}
         
         return {"valid": True}
     
@@ -165,35 +194,29 @@ class SpecificationParserAgent:
         - Validation of device types and commands
         """
         
-        prompt = f"""
-You are a network automation expert. Analyze this automation specification and provide:
-
-1. Validation of device types and compatibility
-2. Suggestions for missing best practices
-3. Identification of potential issues
-4. Recommended additional parameters
-
-Specification:
-{yaml.dump(raw_spec, default_flow_style=False)}
-
-Provide your analysis in this format:
-- Valid: [yes/no]
-- Issues: [list any problems]
-- Recommendations: [list improvements]
-- Enriched Spec: [the specification with recommended additions]
-
-Focus on network automation best practices for Ansible.
-"""
+        # Flow style for leaf collections keeps the prompt short; key order
+        # follows the user's file
+        prompt = SPEC_ENRICHMENT_SYSTEM_PROMPT + yaml.dump(
+            raw_spec,
+            Dumper=_Dumper,
+            default_flow_style=None,
+            sort_keys=False,
+            width=4096
+        )
         
         try:
-            response = await self.model.generate_content_async(prompt)
-            session.increment_metric("tokens_used", len(prompt.split()))
+            response_text = await cached_generate(
+                self.model,
+                prompt,
+                "spec_enrichment"
+            )
+            session.increment_metric("tokens_used", estimate_tokens(prompt))
             
             # For now, return the original spec with AI validation in metadata
             enriched = raw_spec.copy()
             enriched["_ai_validation"] = {
                 "validated": True,
-                "recommendations": response.text[:500]  # First 500 chars
+                "recommendations": response_text[:500]  # First 500 chars
             }
             
             return enriched
@@ -15,7 +15,6 @@ from pathlib import Path
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from agents.orchestrator import OrchestratorAgent, AutomationRequest
 from observability.logger import setup_logger
 from memory.session_manager import SessionManager
 
@@ -126,6 +125,9 @@ async def main():
     logger.info(f"Output directory: {args.output_dir}")
     
     try:
+        # Imported here so --stats does not load the model client and agents
+        from agents.orchestrator import OrchestratorAgent, AutomationRequest
+        
         # Initialize orchestrator
         logger.info("Initializing Network Automation Factory...")
         orchestrator = OrchestratorAgent(
@@ -149,6 +151,9 @@ async def main():
         logger.info("\n🚀 Starting multi-agent workflow...\n")
         result = await orchestrator.process_automation_request(request)
         
+        # Make sure the session record is on disk before exiting
+        await asyncio.to_thread(orchestrator.session_manager.flush)
+        
         # Display results
         print("\n" + "="*70)
         print("🎉 AUTOMATION FACTORY RESULTS")
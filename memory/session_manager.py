@@ -3,25 +3,72 @@ Session Manager - Implements Sessions & Memory
 Handles session state, context management, and long-term memory
 """
 
+import heapq
 import json
 import logging
-from typing import Dict, Any, List, Optional
+import threading
+from collections import defaultdict, deque
+from typing import Deque, Dict, Any, List, Optional, Set, Tuple
 from datetime import datetime
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
 import os
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# Default number of history entries a session keeps
+HISTORY_LIMIT = 256
+
+# Metrics the agents increment on every run, present from the start
+_KNOWN_METRICS = ("agent_calls", "tokens_used", "artifacts", "refinements")
+
+
+def _encode_record(record: Dict[str, Any]) -> bytes:
+    """Serialize one memory bank record as a UTF-8 JSON line"""
+    if orjson is not None:
+        try:
+            # Datetimes and dataclasses go through str() like the json path
+            return orjson.dumps(
+                record,
+                default=str,
+                option=(
+                    orjson.OPT_APPEND_NEWLINE
+                    | orjson.OPT_NON_STR_KEYS
+                    | orjson.OPT_PASSTHROUGH_DATETIME
+                    | orjson.OPT_PASSTHROUGH_DATACLASS
+                )
+            )
+        except TypeError:
+            # e.g. integers wider than 64 bits
+            pass
+    return (json.dumps(record, default=str) + "\n").encode("utf-8")
 
-@dataclass
+
+def _decode_record(line: bytes) -> Dict[str, Any]:
+    """Parse one memory bank line"""
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+@dataclass(slots=True)
 class Session:
     """Represents a session with state and memory"""
     
     session_id: str
     created_at: datetime = field(default_factory=datetime.now)
     context: Dict[str, Any] = field(default_factory=dict)
-    metrics: Dict[str, int] = field(default_factory=dict)
-    history: List[Dict[str, Any]] = field(default_factory=list)
+    metrics: Dict[str, int] = field(
+        default_factory=lambda: dict.fromkeys(_KNOWN_METRICS, 0)
+    )
+    history: Deque[Dict[str, Any]] = field(
+        default_factory=lambda: deque(maxlen=HISTORY_LIMIT)
+    )
     metadata: Dict[str, Any] = field(default_factory=dict)
     
     def add_context(self, key: str, value: Any):
@@ -39,9 +86,7 @@ class Session:
     
     def increment_metric(self, metric_name: str, amount: int = 1):
         """Increment a metric counter"""
-        if metric_name not in self.metrics:
-            self.metrics[metric_name] = 0
-        self.metrics[metric_name] += amount
+        self.metrics[metric_name] = self.metrics.get(metric_name, 0) + amount
     
     def get_metric(self, metric_name: str, default: int = 0) -> int:
         """Get metric value"""
@@ -54,27 +99,21 @@ class Session:
         """
         if len(self.context) > keep_recent:
             # Sort by most recently added (tracked in history)
-            recent_keys = []
+            recent_keys = set()
             for entry in reversed(self.history):
                 if entry.get("action") == "context_added":
-                    key = entry.get("key")
-                    if key not in recent_keys:
-                        recent_keys.append(key)
+                    recent_keys.add(entry.get("key"))
                     if len(recent_keys) >= keep_recent:
                         break
             
-            # Keep only recent context
-            compacted_context = {
-                k: v for k, v in self.context.items()
-                if k in recent_keys
-            }
-            
-            # Store compacted items in summary
-            removed_items = {
-                k: type(v).__name__
-                for k, v in self.context.items()
-                if k not in recent_keys
-            }
+            # Keep only recent context, store compacted items in summary
+            compacted_context = {}
+            removed_items = {}
+            for k, v in self.context.items():
+                if k in recent_keys:
+                    compacted_context[k] = v
+                else:
+                    removed_items[k] = type(v).__name__
             
             self.context = compacted_context
             self.metadata["compacted_items"] = removed_items
@@ -82,10 +121,20 @@ class Session:
             logger.info(f"Context compacted: kept {len(recent_keys)} recent items")
     
     def to_dict(self) -> Dict[str, Any]:
-        """Convert session to dictionary for serialization"""
-        data = asdict(self)
-        data["created_at"] = self.created_at.isoformat()
-        return data
+        """
+        Convert session to dictionary for serialization.
+        
+        The returned dict shares its context, metrics and metadata with the
+        session; callers that mutate it must deep-copy first.
+        """
+        return {
+            "session_id": self.session_id,
+            "created_at": self.created_at.isoformat(),
+            "context": self.context,
+            "metrics": self.metrics,
+            "history": list(self.history),
+            "metadata": self.metadata
+        }
 
 
 class SessionManager:
@@ -99,23 +148,70 @@ class SessionManager:
     - Context engineering utilities
     """
     
-    def __init__(self, memory_dir: str = "./memory"):
+    def __init__(self, memory_dir: str = "./memory", history_limit: int = HISTORY_LIMIT):
         """Initialize session manager with memory storage"""
         self.sessions: Dict[str, Session] = {}
         self.memory_dir = memory_dir
+        self.history_limit = history_limit
         os.makedirs(memory_dir, exist_ok=True)
         
-        # Memory bank file
-        self.memory_bank_path = os.path.join(memory_dir, "memory_bank.json")
-        self.memory_bank = self._load_memory_bank()
+        # Memory bank file: one JSON session record per line, appended on
+        # every store; later lines for a session replace earlier ones
+        self.memory_bank_path = os.path.join(memory_dir, "memory_bank.jsonl")
+        self._record_count = 0
+        
+        # Set when the file could not be read; it is then never rewritten
+        self._load_failed = False
+        
+        # Single JSON document written by earlier versions, imported once
+        self.legacy_memory_bank_path = os.path.join(memory_dir, "memory_bank.json")
+        
+        # Records are encoded by the caller and written by a single
+        # background thread; queued writes coalesce into one file open
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-bank")
+        self._pending_writes: List[Tuple[str, bytes]] = []
+        self._pending_lock = threading.Lock()
+        self._drain_scheduled = False
+        
+        # Stored sessions are read on first use, see memory_bank
+        self._memory_bank: Optional[Dict[str, Any]] = None
         
-        logger.info(f"Session manager initialized with {len(self.memory_bank)} stored sessions")
+        # Inverted keyword index over stored spec descriptions
+        self._keyword_index: Dict[str, Set[str]] = defaultdict(set)
+        self._session_keywords: Dict[str, Set[str]] = {}
+        self._positions: Dict[str, int] = {}
+        
+        # Running totals behind get_statistics, with each session's share
+        self._stats: Dict[str, Any] = {}
+        self._session_stats: Dict[str, Dict[str, Any]] = {}
+        
+        logger.info(f"Session manager initialized with memory bank {self.memory_bank_path}")
+    
+    @property
+    def memory_bank(self) -> Dict[str, Any]:
+        """Stored sessions by id, loaded from disk the first time they are needed"""
+        if self._memory_bank is None:
+            # Queued appends must land before the file is read
+            self.flush()
+            self._memory_bank = self._load_memory_bank()
+            self._rebuild_index()
+            logger.info(f"Memory bank loaded with {len(self._memory_bank)} stored sessions")
+            
+            # Stores made before the first read only appended
+            if self._needs_compaction():
+                self.compact()
+        return self._memory_bank
+    
+    @memory_bank.setter
+    def memory_bank(self, value: Dict[str, Any]):
+        self._memory_bank = value
     
     def create_session(self, session_id: str, metadata: Dict[str, Any] = None) -> Session:
         """Create a new session"""
         
         session = Session(
             session_id=session_id,
+            history=deque(maxlen=self.history_limit),
             metadata=metadata or {}
         )
         
@@ -134,11 +230,27 @@ class SessionManager:
         This enables learning from past automations.
         """
         
+        record = session.to_dict()
+        
+        # Until the memory bank is read, appending is enough: the record is
+        # picked up when the file is loaded. A pending legacy import only
+        # runs while memory_bank.jsonl is missing, so load before appending
+        if self._memory_bank is None and not self._legacy_import_pending():
+            self._append_record(record)
+            logger.info(f"Session stored to memory bank: {session.session_id}")
+            return
+        
         # Add to memory bank
-        self.memory_bank[session.session_id] = session.to_dict()
+        self.memory_bank[session.session_id] = record
+        self._index_session(session.session_id, record)
+        self._tally_session(session.session_id, record)
         
-        # Persist to disk
-        self._save_memory_bank()
+        # Persist to disk in the background by appending just this record
+        self._append_record(record)
+        
+        # Rewrite the file once superseded records dominate it
+        if self._needs_compaction():
+            self.compact()
         
         logger.info(f"Session stored to memory bank: {session.session_id}")
     
@@ -152,29 +264,30 @@ class SessionManager:
         This is a simple keyword-based similarity for now.
         """
         
-        similar_sessions = []
+        memory_bank = self.memory_bank
         keywords = set(spec_description.lower().split())
         
-        for session_id, session_data in self.memory_bank.items():
-            # Get spec description from context
-            context = session_data.get("context", {})
-            parsed_spec = context.get("parsed_spec", {})
-            past_description = parsed_spec.get("description", "").lower()
-            
-            # Calculate simple keyword overlap
-            past_keywords = set(past_description.split())
-            overlap = len(keywords & past_keywords)
-            
-            if overlap > 0:
-                similar_sessions.append({
-                    "session_id": session_id,
-                    "similarity": overlap,
-                    "data": session_data
-                })
+        # Calculate keyword overlap only for sessions sharing a keyword
+        overlaps: Dict[str, int] = defaultdict(int)
+        for keyword in keywords:
+            for session_id in self._keyword_index.get(keyword, ()):
+                overlaps[session_id] += 1
         
-        # Sort by similarity and return top N
-        similar_sessions.sort(key=lambda x: x["similarity"], reverse=True)
-        return similar_sessions[:limit]
+        # Select the top N by similarity, ties in memory bank order, without
+        # sorting every candidate
+        ranked = heapq.nsmallest(
+            limit,
+            overlaps,
+            key=lambda sid: (-overlaps[sid], self._positions[sid])
+        )
+        return [
+            {
+                "session_id": session_id,
+                "similarity": overlaps[session_id],
+                "data": memory_bank[session_id]
+            }
+            for session_id in ranked
+        ]
     
     def get_statistics(self) -> Dict[str, Any]:
         """Get overall statistics from memory bank"""
@@ -185,58 +298,205 @@ class SessionManager:
             return {
                 "total_sessions": 0,
                 "avg_execution_time": 0,
-                "success_rate": 0
+                "success_rate": 0,
+                "total_agent_calls": 0
             }
         
-        execution_times = []
-        successes = 0
-        
-        for session_data in self.memory_bank.values():
-            metrics = session_data.get("metrics", {})
-            
-            # Track execution times (if available in metadata)
-            metadata = session_data.get("metadata", {})
-            if "execution_time" in metadata:
-                execution_times.append(metadata["execution_time"])
-            
-            # Track successes
-            if metadata.get("success", False):
-                successes += 1
+        stats = self._stats
         
         return {
             "total_sessions": total_sessions,
-            "avg_execution_time": sum(execution_times) / len(execution_times) if execution_times else 0,
-            "success_rate": (successes / total_sessions * 100) if total_sessions > 0 else 0,
-            "total_agent_calls": sum(
-                s.get("metrics", {}).get("agent_calls", 0)
-                for s in self.memory_bank.values()
-            )
+            "avg_execution_time": stats["exec_sum"] / stats["exec_n"] if stats["exec_n"] else 0,
+            "success_rate": stats["success"] / total_sessions * 100,
+            "total_agent_calls": stats["agent_calls"]
+        }
+    
+    def _tally_session(self, session_id: str, session_data: Dict[str, Any]):
+        """Replace one stored session's contribution to the running totals"""
+        
+        stats = self._stats
+        previous = self._session_stats.get(session_id)
+        if previous is not None:
+            for name, value in previous.items():
+                stats[name] -= value
+        
+        # Track execution times (if available in metadata) and successes
+        metadata = session_data.get("metadata", {})
+        has_time = "execution_time" in metadata
+        share = {
+            "exec_sum": metadata["execution_time"] if has_time else 0.0,
+            "exec_n": 1 if has_time else 0,
+            "success": 1 if metadata.get("success", False) else 0,
+            "agent_calls": session_data.get("metrics", {}).get("agent_calls", 0)
         }
+        for name, value in share.items():
+            stats[name] += value
+        self._session_stats[session_id] = share
+    
+    def _index_session(self, session_id: str, session_data: Dict[str, Any]):
+        """Add or refresh one stored session in the keyword index"""
+        
+        for keyword in self._session_keywords.pop(session_id, ()):
+            self._keyword_index[keyword].discard(session_id)
+        
+        # Get spec description from context
+        context = session_data.get("context", {})
+        parsed_spec = context.get("parsed_spec", {})
+        past_description = parsed_spec.get("description", "").lower()
+        
+        keywords = set(past_description.split())
+        for keyword in keywords:
+            self._keyword_index[keyword].add(session_id)
+        self._session_keywords[session_id] = keywords
+        self._positions.setdefault(session_id, len(self._positions))
+    
+    def _rebuild_index(self):
+        """Index and tally every session in the memory bank"""
+        
+        self._keyword_index.clear()
+        self._session_keywords.clear()
+        self._positions.clear()
+        self._session_stats.clear()
+        self._stats = {"exec_sum": 0.0, "exec_n": 0, "success": 0, "agent_calls": 0}
+        for session_id, session_data in self.memory_bank.items():
+            self._index_session(session_id, session_data)
+            self._tally_session(session_id, session_data)
+    
+    def _needs_compaction(self) -> bool:
+        """Whether superseded records dominate a successfully loaded file"""
+        return (
+            not self._load_failed
+            and self._record_count > 2 * len(self.memory_bank)
+        )
+    
+    def compact(self):
+        """Rewrite the memory bank file with one record per stored session"""
+        self._save_memory_bank()
     
     def _load_memory_bank(self) -> Dict[str, Any]:
         """Load memory bank from disk"""
         
-        if os.path.exists(self.memory_bank_path):
-            try:
-                with open(self.memory_bank_path, 'r') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"Failed to load memory bank: {str(e)}")
-                return {}
+        memory_bank = {}
+        self._record_count = 0
+        
+        if not os.path.exists(self.memory_bank_path):
+            return self._load_legacy_memory_bank()
+        
+        try:
+            with open(self.memory_bank_path, 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        record = _decode_record(line)
+                        memory_bank[record["session_id"]] = record
+                    except (ValueError, KeyError, TypeError):
+                        # Partial lines from a crash, or foreign records
+                        logger.warning("Skipping unreadable memory bank record")
+                        continue
+                    self._record_count += 1
+        except Exception as e:
+            logger.error(f"Failed to load memory bank: {str(e)}")
+            self._load_failed = True
+            return {}
         
-        return {}
+        return memory_bank
+    
+    def _legacy_import_pending(self) -> bool:
+        """Whether a legacy memory_bank.json still awaits import"""
+        return (
+            self._record_count == 0
+            and not os.path.exists(self.memory_bank_path)
+            and os.path.exists(self.legacy_memory_bank_path)
+        )
+    
+    def _load_legacy_memory_bank(self) -> Dict[str, Any]:
+        """Import a memory_bank.json written by earlier versions"""
+        
+        legacy_path = self.legacy_memory_bank_path
+        if not os.path.exists(legacy_path):
+            return {}
+        
+        try:
+            with open(legacy_path, 'r') as f:
+                memory_bank = json.load(f)
+        except Exception as e:
+            logger.error(f"Failed to load memory bank: {str(e)}")
+            return {}
+        
+        self.memory_bank = memory_bank
+        self._save_memory_bank()
+        logger.info(f"Migrated {len(memory_bank)} sessions from {legacy_path}")
+        return memory_bank
+    
+    def _queue_write(self, mode: str, data: bytes):
+        """Queue a file write for the background writer"""
+        
+        with self._pending_lock:
+            if mode == "replace":
+                # A full rewrite supersedes everything still queued
+                self._pending_writes.clear()
+            self._pending_writes.append((mode, data))
+            if self._drain_scheduled:
+                return
+            self._drain_scheduled = True
+        self._writer.submit(self._drain_writes)
+    
+    def _drain_writes(self):
+        """Apply queued writes in order (runs on the writer thread)"""
+        
+        with self._pending_lock:
+            writes, self._pending_writes = self._pending_writes, []
+            self._drain_scheduled = False
+        
+        try:
+            i = 0
+            while i < len(writes):
+                mode, data = writes[i]
+                if mode == "replace":
+                    tmp_path = f"{self.memory_bank_path}.tmp"
+                    with open(tmp_path, 'wb') as f:
+                        f.write(data)
+                    os.replace(tmp_path, self.memory_bank_path)
+                    i += 1
+                    continue
+                
+                # Batch consecutive appends into one open
+                with open(self.memory_bank_path, 'ab') as f:
+                    while i < len(writes) and writes[i][0] == "append":
+                        f.write(writes[i][1])
+                        i += 1
+        except Exception as e:
+            logger.error(f"Failed to save memory bank: {str(e)}")
+    
+    def flush(self):
+        """Block until every queued memory bank write is on disk"""
+        self._writer.submit(lambda: None).result()
+    
+    def _append_record(self, record: Dict[str, Any]):
+        """Append one session record to the memory bank file"""
+        
+        try:
+            self._queue_write("append", _encode_record(record))
+            self._record_count += 1
+        except Exception as e:
+            logger.error(f"Failed to save memory bank: {str(e)}")
     
     def _save_memory_bank(self):
-        """Persist memory bank to disk"""
+        """Persist the whole memory bank to disk, replacing the file"""
         
         try:
-            with open(self.memory_bank_path, 'w') as f:
-                json.dump(self.memory_bank, f, indent=2, default=str)
+            data = b"".join(
+                _encode_record(record) for record in self.memory_bank.values()
+            )
+            self._queue_write("replace", data)
+            self._record_count = len(self.memory_bank)
         except Exception as e:
             logger.error(f"Failed to save memory bank: {str(e)}")
     
     def clear_memory_bank(self):
         """Clear all stored sessions (use with caution)"""
         self.memory_bank = {}
+        self._rebuild_index()
         self._save_memory_bank()
         logger.warning("Memory bank cleared")
@@ -1,4 +1,4 @@
 """Network Automation Factory - Observability Module"""
-from .logger import setup_logger, MetricsCollector, Tracer
+from .logger import setup_logger, shutdown_logger, MetricsCollector, Tracer
 
-__all__ = ['setup_logger', 'MetricsCollector', 'Tracer']
+__all__ = ['setup_logger', 'shutdown_logger', 'MetricsCollector', 'Tracer']
@@ -3,24 +3,140 @@ Observability Module
 Implements logging, tracing, and metrics collection
 """
 
+import atexit
 import logging
+import logging.handlers
+import math
+import queue
 import sys
-from datetime import datetime
-from typing import Dict, Any, List
+import threading
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Deque, Dict, Any, List, Optional
 import json
 import os
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Every logger from setup_logger enqueues its records here; one listener
+# thread drains the queue into the shared console and file handlers
+_log_queue: queue.Queue = queue.Queue(-1)
+_listener: Optional[logging.handlers.QueueListener] = None
+_listener_lock = threading.Lock()
+
+_console_handler: Optional[logging.Handler] = None
+
+# One rotating log file, so only one handler ever rolls it over
+_file_handler: Optional[logging.Handler] = None
+
+LOG_MAX_BYTES = 64 << 20
+LOG_BACKUP_COUNT = 10
+
+_FORMATTER = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records, tagged with whether they belong in the log file"""
+    
+    def __init__(self, to_file: bool):
+        super().__init__(_log_queue)
+        self.to_file = to_file
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        record.to_file = self.to_file
+        return record
+
+
+_queue_handlers = {True: _QueueHandler(to_file=True), False: _QueueHandler(to_file=False)}
+
+
+def _to_file(record: logging.LogRecord) -> bool:
+    return getattr(record, "to_file", True)
+
+
+def _shared_file_handler() -> logging.Handler:
+    """Create the rotating file handler on first use"""
+    global _file_handler
+    if _file_handler is None:
+        os.makedirs("./logs", exist_ok=True)
+        _file_handler = logging.handlers.RotatingFileHandler(
+            f"./logs/automation_factory_{datetime.now().strftime('%Y%m%d')}.log",
+            maxBytes=LOG_MAX_BYTES,
+            backupCount=LOG_BACKUP_COUNT
+        )
+        _file_handler.setLevel(logging.DEBUG)
+        _file_handler.setFormatter(_FORMATTER)
+        _file_handler.addFilter(_to_file)
+    return _file_handler
+
+
+def _start_listener(file_logging: bool):
+    """Start the listener, or restart it once the file handler is needed"""
+    global _listener, _console_handler
+    with _listener_lock:
+        if _console_handler is None:
+            _console_handler = logging.StreamHandler(sys.stdout)
+            _console_handler.setFormatter(_FORMATTER)
+        
+        handlers: List[logging.Handler] = [_console_handler]
+        if file_logging or _file_handler is not None:
+            handlers.append(_shared_file_handler())
+        
+        if _listener is not None:
+            if len(_listener.handlers) == len(handlers):
+                return
+            # Drains the queue before the new listener takes over
+            _listener.stop()
+        
+        _listener = logging.handlers.QueueListener(
+            _log_queue,
+            *handlers,
+            respect_handler_level=True
+        )
+        _listener.start()
+
+
+def _running_under_pytest() -> bool:
+    """Whether a pytest test is currently running in this process"""
+    return "PYTEST_CURRENT_TEST" in os.environ
+
 
 # Setup logging configuration
-def setup_logger(name: str, level: int = logging.INFO) -> logging.Logger:
+def setup_logger(
+    name: str,
+    level: int = logging.INFO,
+    file_logging: Optional[bool] = None
+) -> logging.Logger:
     """
     Setup structured logging with comprehensive output.
     
     Implements:
-    - Console and file logging
+    - Console and size-rotated file logging
     - Structured log format
     - Different log levels per module
+    
+    The logger itself only enqueues records; one QueueListener thread
+    shared by all loggers writes them to the console and file, in the
+    order they were logged, so logging calls never wait on I/O. The
+    logger's level filters records before they are queued.
+    file_logging defaults to on, except while a pytest test is running
+    (PYTEST_CURRENT_TEST is set), where no log file is created.
     """
     
+    if file_logging is None:
+        file_logging = not _running_under_pytest()
+    
     logger = logging.getLogger(name)
     logger.setLevel(level)
     
@@ -28,30 +144,292 @@ def setup_logger(name: str, level: int = logging.INFO) -> logging.Logger:
     if logger.handlers:
         return logger
     
-    # Console handler
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(level)
+    _start_listener(file_logging)
+    logger.addHandler(_queue_handlers[file_logging])
+    
+    return logger
+
+
+def shutdown_logger():
+    """Stop the listener, writing out any queued records"""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(shutdown_logger)
+
+
+def _dump_json(obj: Any) -> bytes:
+    """Serialize obj as compact JSON bytes ending in a newline"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _load_json(line: bytes) -> Any:
+    """Parse one JSON line"""
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+# Event and entry fields holding timestamps
+_TIME_FIELDS = ("timestamp", "completed_at", "failed_at")
+
+
+def _now_ns() -> int:
+    """time.time_ns() cut to the microseconds an ISO timestamp keeps"""
+    return time.time_ns() // 1000 * 1000
+
+
+def _iso_from_ns(ns: int) -> str:
+    """UTC ISO 8601 form of a nanosecond timestamp"""
+    seconds, nanos = divmod(ns, 1_000_000_000)
+    moment = datetime.fromtimestamp(seconds, timezone.utc)
+    return moment.replace(microsecond=nanos // 1000).isoformat()
+
+
+def _ns_from_iso(value: Any) -> int:
+    """
+    Nanosecond timestamp from an ISO 8601 string.
+    
+    Strings without an offset, as older logs wrote them, are local time;
+    integers, written by earlier versions of the JSONL log, pass through.
+    """
+    if isinstance(value, int):
+        return value
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.astimezone()
+    seconds = int(moment.replace(microsecond=0).timestamp())
+    return seconds * 1_000_000_000 + moment.microsecond * 1000
+
+
+def _dump_event(event: Dict[str, Any]) -> bytes:
+    """Serialize an event or entry with its timestamps in ISO form"""
+    event = dict(event)
+    for name in _TIME_FIELDS:
+        if event.get(name) is not None:
+            event[name] = _iso_from_ns(event[name])
+    return _dump_json(event)
+
+
+def _parse_times(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn an event's ISO timestamps back into integers, in place"""
+    for name in _TIME_FIELDS:
+        if event.get(name) is not None:
+            event[name] = _ns_from_iso(event[name])
+    return event
+
+
+def _load_event(line: bytes) -> Dict[str, Any]:
+    """Parse one log line, timestamps included"""
+    return _parse_times(_load_json(line))
+
+
+# Entries of each kind MetricsCollector keeps in memory
+MAX_ENTRIES = 100_000
+
+# Relative error of the execution time percentiles
+HISTOGRAM_ACCURACY = 0.01
+
+# Longest time appended metrics events go without an fsync
+SYNC_INTERVAL = 30.0
+
+
+@dataclass(slots=True)
+class RequestRecord:
+    """One automation request as stored by MetricsCollector"""
+    
+    session_id: str
+    status: str
+    timestamp: int
+    execution_time: Optional[float] = None
+    artifacts_count: Optional[int] = None
+    completed_at: Optional[int] = None
+    error: Optional[str] = None
+    failed_at: Optional[int] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Fields that are set, for the JSONL log"""
+        return {
+            name: getattr(self, name)
+            for name in self.__slots__
+            if getattr(self, name) is not None
+        }
+
+
+@dataclass(slots=True)
+class AgentCallRecord:
+    """One agent call as stored by MetricsCollector"""
+    
+    agent: str
+    session_id: str
+    duration: float
+    success: bool
+    timestamp: int
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Fields for the JSONL log"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+@dataclass(slots=True)
+class ErrorRecord:
+    """One failed request's error as stored by MetricsCollector"""
+    
+    session_id: str
+    error: str
+    timestamp: int
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Fields for the JSONL log"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class _Histogram:
+    """
+    Log-bucketed histogram of positive values with bounded relative error.
+    
+    Each bucket covers values within HISTOGRAM_ACCURACY of its midpoint, so
+    memory grows with the log of the value range, not the number of values.
+    """
+    
+    __slots__ = ("buckets", "count")
+    
+    _GAMMA = (1 + HISTOGRAM_ACCURACY) / (1 - HISTOGRAM_ACCURACY)
+    _LOG_GAMMA = math.log(_GAMMA)
+    
+    # Values at or below this share one bucket reported as 0
+    _MIN_VALUE = 1e-9
+    _ZERO_KEY = math.ceil(math.log(_MIN_VALUE) / _LOG_GAMMA) - 1
+    
+    def __init__(self):
+        self.buckets: Dict[int, int] = defaultdict(int)
+        self.count = 0
+    
+    def add(self, value: float):
+        if value <= self._MIN_VALUE:
+            key = self._ZERO_KEY
+        else:
+            key = math.ceil(math.log(value) / self._LOG_GAMMA)
+        self.buckets[key] += 1
+        self.count += 1
+    
+    def _value(self, key: int) -> float:
+        if key == self._ZERO_KEY:
+            return 0.0
+        return 2 * self._GAMMA ** key / (self._GAMMA + 1)
+    
+    def quantile(self, q: float) -> float:
+        """Approximate q-quantile, 0 when empty"""
+        if not self.count:
+            return 0
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.buckets))
     
-    # File handler
-    os.makedirs("./logs", exist_ok=True)
-    file_handler = logging.FileHandler(
-        f"./logs/automation_factory_{datetime.now().strftime('%Y%m%d')}.log"
+    def minus(self, other: "_Histogram") -> List[List[int]]:
+        """Bucket counts in self that other lacks, as [key, count] pairs"""
+        return [
+            [key, count - other.buckets.get(key, 0)]
+            for key, count in self.buckets.items()
+            if count != other.buckets.get(key, 0)
+        ]
+    
+    def add_counts(self, pairs: List[List[int]]):
+        """Fold in pairs produced by minus()"""
+        for key, count in pairs:
+            self.buckets[key] += count
+            self.count += count
+
+
+class _Totals:
+    """Running counts and sums behind MetricsCollector.get_summary"""
+    
+    __slots__ = (
+        "requests", "completed", "failed", "errors",
+        "exec_time_sum", "exec_time_n", "exec_times", "agents"
     )
-    file_handler.setLevel(logging.DEBUG)
     
-    # Formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
+    _SCALARS = (
+        "requests", "completed", "failed", "errors",
+        "exec_time_sum", "exec_time_n"
     )
     
-    console_handler.setFormatter(formatter)
-    file_handler.setFormatter(formatter)
+    def __init__(self):
+        self.requests = 0
+        self.completed = 0
+        self.failed = 0
+        self.errors = 0
+        self.exec_time_sum = 0.0
+        self.exec_time_n = 0
+        self.exec_times = _Histogram()
+        # agent -> [total calls, successful calls, total duration]
+        self.agents: Dict[str, List[Any]] = defaultdict(lambda: [0, 0, 0])
     
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    def add_request(self, request: RequestRecord):
+        """Count a stored request in whatever state it is in"""
+        self.requests += 1
+        if request.status == "completed":
+            self.add_completed(request)
+        elif request.status == "failed":
+            self.failed += 1
     
-    return logger
+    def add_completed(self, request: RequestRecord):
+        """Count a request that has just completed"""
+        self.completed += 1
+        if request.execution_time is not None:
+            self.exec_time_sum += request.execution_time
+            self.exec_time_n += 1
+            self.exec_times.add(request.execution_time)
+    
+    def add_agent_call(self, call: AgentCallRecord):
+        """Count an agent call"""
+        totals = self.agents[call.agent]
+        totals[0] += 1
+        if call.success:
+            totals[1] += 1
+        totals[2] += call.duration
+    
+    def minus(self, other: "_Totals") -> Dict[str, Any]:
+        """The counts in self that other lacks, as a JSON-ready dict"""
+        diff: Dict[str, Any] = {
+            name: getattr(self, name) - getattr(other, name)
+            for name in self._SCALARS
+        }
+        diff["exec_times"] = self.exec_times.minus(other.exec_times)
+        diff["agents"] = {}
+        for agent, totals in self.agents.items():
+            rest = [a - b for a, b in zip(totals, other.agents.get(agent, (0, 0, 0)))]
+            if rest[0]:
+                diff["agents"][agent] = rest
+        return diff
+    
+    def add(self, counts: Dict[str, Any]):
+        """Fold in counts produced by minus()"""
+        for name in self._SCALARS:
+            setattr(self, name, getattr(self, name) + counts[name])
+        self.exec_times.add_counts(counts["exec_times"])
+        for agent, rest in counts["agents"].items():
+            totals = self.agents[agent]
+            for i, value in enumerate(rest):
+                totals[i] += value
+
+
+# (event type, metrics key) for the entries a compacted log holds
+_SNAPSHOT_ENTRIES = (
+    ("request", "requests"),
+    ("error", "errors"),
+    ("agent_call", "agent_calls"),
+)
 
 
 class MetricsCollector:
@@ -64,31 +442,100 @@ class MetricsCollector:
     - Success/failure rates
     - Agent performance
     - Resource usage
+    
+    Every record_* call becomes one event appended to a JSONL log, and the
+    in-memory metrics are rebuilt by replaying that log on load. Events are
+    buffered and appended by a background thread every flush_interval
+    seconds; call flush() to write immediately. In memory, timestamps are
+    integer nanoseconds since the epoch (time.time_ns(), to the
+    microsecond); the log stores them as UTC ISO 8601 strings.
+    
+    Appended events are fsynced at most every SYNC_INTERVAL seconds and
+    once at exit, never per event. A power loss or kernel crash can
+    therefore drop up to SYNC_INTERVAL seconds of metrics history; a
+    process crash only loses events not yet flushed.
+    
+    Use MetricsCollector.instance() to share one collector per file, and
+    close() to stop a collector that should not live until exit.
     """
     
-    def __init__(self, metrics_file: str = "./logs/metrics.json"):
+    _instances: Dict[str, "MetricsCollector"] = {}
+    _instances_lock = threading.Lock()
+    
+    @classmethod
+    def instance(
+        cls,
+        metrics_file: str = "./logs/metrics.jsonl",
+        flush_interval: float = 5.0
+    ) -> "MetricsCollector":
+        """Return the shared collector for a metrics file, creating it once"""
+        key = os.path.abspath(metrics_file)
+        with cls._instances_lock:
+            collector = cls._instances.get(key)
+            if collector is None:
+                collector = cls(metrics_file, flush_interval)
+                cls._instances[key] = collector
+            return collector
+    
+    def __init__(
+        self,
+        metrics_file: str = "./logs/metrics.jsonl",
+        flush_interval: float = 5.0,
+        max_entries: int = MAX_ENTRIES
+    ):
         """Initialize metrics collector"""
         self.metrics_file = metrics_file
-        self.metrics: Dict[str, List[Dict[str, Any]]] = {
-            "requests": [],
-            "agent_calls": [],
-            "errors": []
+        self.flush_interval = flush_interval
+        
+        # Only the newest max_entries of each kind stay in memory; older
+        # ones still count in the running totals
+        self.metrics: Dict[str, Deque[Any]] = {
+            "requests": deque(maxlen=max_entries),
+            "agent_calls": deque(maxlen=max_entries),
+            "errors": deque(maxlen=max_entries)
         }
         
+        # Guards self.metrics and the pending events; _save_lock
+        # serializes file writes
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._pending: List[Dict[str, Any]] = []
+        
+        # Appends not yet fsynced, and when the log was last synced
+        self._unsynced = False
+        self._last_sync = time.monotonic()
+        
+        # Requests still in "started" state, by session id in start order
+        self._started: Dict[str, List[RequestRecord]] = {}
+        
+        # Running totals behind get_summary
+        self._totals = _Totals()
+        
+        # Create the log directory once rather than on every write
+        os.makedirs(os.path.dirname(self.metrics_file) or ".", exist_ok=True)
+        
         # Load existing metrics
         self._load_metrics()
         
-        logger = logging.getLogger(__name__)
+        # Write pending events periodically and once more on close or exit
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_loop,
+            name="metrics-flush",
+            daemon=True
+        )
+        self._flusher.start()
+        atexit.register(self.close)
+        
         logger.info(f"Metrics collector initialized")
     
     def record_request_started(self, session_id: str):
         """Record when a request starts"""
-        self.metrics["requests"].append({
+        self._record({
+            "type": "request_started",
             "session_id": session_id,
-            "status": "started",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _now_ns()
         })
-        self._save_metrics()
     
     def record_request_completed(
         self,
@@ -97,37 +544,22 @@ class MetricsCollector:
         artifacts_count: int
     ):
         """Record successful request completion"""
-        
-        # Find and update the request
-        for request in self.metrics["requests"]:
-            if request["session_id"] == session_id and request["status"] == "started":
-                request["status"] = "completed"
-                request["execution_time"] = execution_time
-                request["artifacts_count"] = artifacts_count
-                request["completed_at"] = datetime.now().isoformat()
-                break
-        
-        self._save_metrics()
+        self._record({
+            "type": "request_completed",
+            "session_id": session_id,
+            "execution_time": execution_time,
+            "artifacts_count": artifacts_count,
+            "timestamp": _now_ns()
+        })
     
     def record_request_failed(self, session_id: str, error: str):
         """Record failed request"""
-        
-        # Find and update the request
-        for request in self.metrics["requests"]:
-            if request["session_id"] == session_id and request["status"] == "started":
-                request["status"] = "failed"
-                request["error"] = error
-                request["failed_at"] = datetime.now().isoformat()
-                break
-        
-        # Record error
-        self.metrics["errors"].append({
+        self._record({
+            "type": "request_failed",
             "session_id": session_id,
             "error": error,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _now_ns()
         })
-        
-        self._save_metrics()
     
     def record_agent_call(
         self,
@@ -137,67 +569,123 @@ class MetricsCollector:
         success: bool
     ):
         """Record individual agent call"""
-        
-        self.metrics["agent_calls"].append({
+        self._record({
+            "type": "agent_call",
             "agent": agent_name,
             "session_id": session_id,
             "duration": duration,
             "success": success,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _now_ns()
         })
+    
+    def _record(self, event: Dict[str, Any]):
+        """Apply an event to the in-memory metrics and queue it for the log"""
+        with self._lock:
+            self._apply(event)
+            self._pending.append(event)
+    
+    def _apply(self, event: Dict[str, Any]):
+        """Update self.metrics for one event (caller holds self._lock)"""
+        
+        event_type = event["type"]
         
-        self._save_metrics()
+        if event_type == "request_started":
+            request = RequestRecord(
+                event["session_id"], "started", event["timestamp"]
+            )
+            self.metrics["requests"].append(request)
+            self._started.setdefault(request.session_id, []).append(request)
+            self._totals.requests += 1
+        
+        elif event_type == "request_completed":
+            request = self._pop_started(event["session_id"])
+            if request is not None:
+                request.status = "completed"
+                request.execution_time = event["execution_time"]
+                request.artifacts_count = event["artifacts_count"]
+                request.completed_at = event["timestamp"]
+                self._totals.add_completed(request)
+        
+        elif event_type == "request_failed":
+            request = self._pop_started(event["session_id"])
+            if request is not None:
+                request.status = "failed"
+                request.error = event["error"]
+                request.failed_at = event["timestamp"]
+                self._totals.failed += 1
+            
+            # Record error
+            self.metrics["errors"].append(ErrorRecord(
+                event["session_id"], event["error"], event["timestamp"]
+            ))
+            self._totals.errors += 1
+        
+        elif event_type == "agent_call":
+            call = AgentCallRecord(
+                event["agent"],
+                event["session_id"],
+                event["duration"],
+                event["success"],
+                event["timestamp"]
+            )
+            self.metrics["agent_calls"].append(call)
+            self._totals.add_agent_call(call)
+        
+        # Entry types written by compact(), one line per stored entry
+        elif event_type == "request":
+            del event["type"]
+            request = RequestRecord(**event)
+            self.metrics["requests"].append(request)
+            self._totals.add_request(request)
+            if request.status == "started":
+                self._started.setdefault(request.session_id, []).append(request)
+        
+        elif event_type == "error":
+            del event["type"]
+            self.metrics["errors"].append(ErrorRecord(**event))
+            self._totals.errors += 1
+        
+        elif event_type == "evicted":
+            # Totals of entries that no longer fit in memory
+            self._totals.add(event["totals"])
+    
+    def _pop_started(self, session_id: str) -> Optional[RequestRecord]:
+        """Take the oldest still-started request for a session"""
+        started = self._started.get(session_id)
+        if not started:
+            return None
+        request = started.pop(0)
+        if not started:
+            del self._started[session_id]
+        return request
     
     def get_summary(self) -> Dict[str, Any]:
-        """Get summary statistics"""
-        
-        total_requests = len(self.metrics["requests"])
-        completed_requests = len([
-            r for r in self.metrics["requests"]
-            if r["status"] == "completed"
-        ])
-        failed_requests = len([
-            r for r in self.metrics["requests"]
-            if r["status"] == "failed"
-        ])
-        
-        # Calculate average execution time
-        execution_times = [
-            r["execution_time"]
-            for r in self.metrics["requests"]
-            if r["status"] == "completed" and "execution_time" in r
-        ]
-        avg_execution_time = (
-            sum(execution_times) / len(execution_times)
-            if execution_times else 0
-        )
+        """Get summary statistics from the running totals"""
         
-        # Agent statistics
-        agent_stats = {}
-        for call in self.metrics["agent_calls"]:
-            agent = call["agent"]
-            if agent not in agent_stats:
-                agent_stats[agent] = {
-                    "total_calls": 0,
-                    "successful_calls": 0,
-                    "total_duration": 0
-                }
+        with self._lock:
+            totals = self._totals
+            total_requests = totals.requests
+            completed_requests = totals.completed
+            failed_requests = totals.failed
+            total_errors = totals.errors
             
-            agent_stats[agent]["total_calls"] += 1
-            if call["success"]:
-                agent_stats[agent]["successful_calls"] += 1
-            agent_stats[agent]["total_duration"] += call["duration"]
-        
-        # Calculate averages
-        for agent, stats in agent_stats.items():
-            stats["avg_duration"] = (
-                stats["total_duration"] / stats["total_calls"]
-                if stats["total_calls"] > 0 else 0
-            )
-            stats["success_rate"] = (
-                stats["successful_calls"] / stats["total_calls"] * 100
-                if stats["total_calls"] > 0 else 0
+            # Calculate average execution time
+            avg_execution_time = (
+                totals.exec_time_sum / totals.exec_time_n
+                if totals.exec_time_n else 0
             )
+            
+            # Calculate agent averages; every tracked agent has a call
+            agent_stats = {
+                agent: {
+                    "total_calls": calls,
+                    "successful_calls": successes,
+                    "total_duration": duration,
+                    "avg_duration": duration / calls,
+                    "success_rate": successes / calls * 100
+                }
+                for agent, (calls, successes, duration) in totals.agents.items()
+            }
         
         return {
             "total_requests": total_requests,
@@ -208,27 +696,178 @@ class MetricsCollector:
                 if total_requests > 0 else 0
             ),
             "avg_execution_time": avg_execution_time,
-            "total_errors": len(self.metrics["errors"]),
+            "execution_time_percentiles": {
+                "p50": totals.exec_times.quantile(0.50),
+                "p95": totals.exec_times.quantile(0.95),
+                "p99": totals.exec_times.quantile(0.99)
+            },
+            "total_errors": total_errors,
             "agent_statistics": agent_stats
         }
     
     def _load_metrics(self):
-        """Load metrics from file"""
-        if os.path.exists(self.metrics_file):
+        """Rebuild metrics by replaying the event log"""
+        if not os.path.exists(self.metrics_file):
+            self._load_legacy_metrics()
+            return
+        
+        updates = 0
+        try:
+            with open(self.metrics_file, 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        event = _load_event(line)
+                    except (ValueError, TypeError, AttributeError):
+                        # A write cut short by a crash leaves a partial line
+                        logger.warning("Skipping unreadable metrics event")
+                        continue
+                    # _apply consumes the type of snapshot entries
+                    if event["type"] in ("request_completed", "request_failed"):
+                        updates += 1
+                    self._apply(event)
+        except Exception as e:
+            logger.warning(f"Failed to load metrics: {str(e)}")
+            return
+        
+        # Fold completion and failure updates into their requests
+        if updates:
+            self.compact()
+    
+    def _load_legacy_metrics(self):
+        """Import a metrics.json written by earlier versions into the log"""
+        
+        legacy_path = os.path.splitext(self.metrics_file)[0] + ".json"
+        if legacy_path == self.metrics_file or not os.path.exists(legacy_path):
+            return
+        
+        try:
+            with open(legacy_path, 'rb') as f:
+                legacy = _load_json(f.read())
+        except Exception as e:
+            logger.warning(f"Failed to load metrics: {str(e)}")
+            return
+        
+        # Replay the stored entries as if read back from a compacted log
+        imported = 0
+        for entry_type, key in _SNAPSHOT_ENTRIES:
+            for entry in legacy.get(key, []):
+                try:
+                    self._apply(_parse_times({"type": entry_type, **entry}))
+                    imported += 1
+                except (ValueError, TypeError, KeyError):
+                    logger.warning("Skipping unreadable legacy metrics entry")
+        
+        self.compact()
+        logger.info(f"Migrated {imported} metrics entries from {legacy_path}")
+    
+    def compact(self):
+        """
+        Replace the event log with a snapshot of the current metrics.
+        
+        The snapshot holds one line per stored request, error and agent
+        call, so loading it streams like any other log, plus one line with
+        the totals of entries already dropped from memory. It is written to
+        a per-process temporary file and renamed over the log, so a crash
+        leaves either the old log or the new one. There is no fsync; the
+        rename only orders the two versions.
+        """
+        with self._save_lock:
+            with self._lock:
+                lines = [
+                    _dump_event({"type": entry_type, **entry.to_dict()})
+                    for entry_type, key in _SNAPSHOT_ENTRIES
+                    for entry in self.metrics[key]
+                ]
+                
+                # Whatever the stored entries do not account for was evicted
+                stored = _Totals()
+                for request in self.metrics["requests"]:
+                    stored.add_request(request)
+                for call in self.metrics["agent_calls"]:
+                    stored.add_agent_call(call)
+                stored.errors = len(self.metrics["errors"])
+                evicted = self._totals.minus(stored)
+                if evicted["requests"] or evicted["errors"] or evicted["agents"]:
+                    lines.insert(0, _dump_json({"type": "evicted", "totals": evicted}))
+                
+                data = b"".join(lines)
+                events, self._pending = self._pending, []
+            
+            tmp_path = f"{self.metrics_file}.{os.getpid()}.tmp"
             try:
-                with open(self.metrics_file, 'r') as f:
-                    self.metrics = json.load(f)
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, self.metrics_file)
             except Exception as e:
-                logging.warning(f"Failed to load metrics: {str(e)}")
+                logger.error(f"Failed to save metrics: {str(e)}")
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                with self._lock:
+                    # The old log is intact; append these events to it later
+                    self._pending[:0] = events
+    
+    def flush(self, sync: bool = False):
+        """
+        Append buffered events to the log now.
+        
+        The log is also fsynced when SYNC_INTERVAL has passed since the
+        last sync, or right away when sync is true.
+        """
+        with self._save_lock:
+            with self._lock:
+                events, self._pending = self._pending, []
+            if events:
+                self._save_metrics(events)
+            if self._unsynced and (
+                sync or time.monotonic() - self._last_sync >= SYNC_INTERVAL
+            ):
+                self._sync_metrics()
     
-    def _save_metrics(self):
-        """Save metrics to file"""
+    def _sync_metrics(self):
+        """fsync the log file (caller holds self._save_lock)"""
         try:
-            os.makedirs(os.path.dirname(self.metrics_file), exist_ok=True)
-            with open(self.metrics_file, 'w') as f:
-                json.dump(self.metrics, f, indent=2)
+            with open(self.metrics_file, 'ab') as f:
+                os.fsync(f.fileno())
+            self._unsynced = False
+            self._last_sync = time.monotonic()
         except Exception as e:
-            logging.error(f"Failed to save metrics: {str(e)}")
+            logger.error(f"Failed to sync metrics: {str(e)}")
+    
+    def close(self):
+        """Stop the background writer and write and sync buffered events"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._flusher.join()
+        self.flush(sync=True)
+        atexit.unregister(self.close)
+        
+        key = os.path.abspath(self.metrics_file)
+        with self._instances_lock:
+            if self._instances.get(key) is self:
+                del self._instances[key]
+    
+    def _flush_loop(self):
+        """Background writer: flush every flush_interval seconds until closed"""
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+    
+    def _save_metrics(self, events: List[Dict[str, Any]]):
+        """Encode events and append them to the log file"""
+        try:
+            data = b"".join(_dump_event(event) for event in events)
+            with open(self.metrics_file, 'ab') as f:
+                f.write(data)
+            self._unsynced = True
+        except Exception as e:
+            logger.error(f"Failed to save metrics: {str(e)}")
+            with self._lock:
+                # Keep the events for the next flush, in order
+                self._pending[:0] = events
 
 
 class Tracer:
@@ -243,27 +882,27 @@ class Tracer:
     
     def __init__(self):
         self.traces: Dict[str, List[Dict[str, Any]]] = {}
+        
+        # Running traces per session and operation, most recent last
+        self._running: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
     
     def start_trace(self, session_id: str, operation: str):
         """Start a new trace"""
-        if session_id not in self.traces:
-            self.traces[session_id] = []
-        
-        self.traces[session_id].append({
+        trace = {
             "operation": operation,
             "start_time": datetime.now().isoformat(),
             "status": "running"
-        })
+        }
+        self.traces.setdefault(session_id, []).append(trace)
+        self._running.setdefault(session_id, {}).setdefault(operation, []).append(trace)
     
     def end_trace(self, session_id: str, operation: str, success: bool = True):
-        """End a trace"""
-        if session_id in self.traces:
-            for trace in reversed(self.traces[session_id]):
-                if (trace["operation"] == operation and 
-                    trace["status"] == "running"):
-                    trace["end_time"] = datetime.now().isoformat()
-                    trace["status"] = "completed" if success else "failed"
-                    break
+        """End the most recent running trace of an operation"""
+        running = self._running.get(session_id, {}).get(operation)
+        if running:
+            trace = running.pop()
+            trace["end_time"] = datetime.now().isoformat()
+            trace["status"] = "completed" if success else "failed"
     
     def get_trace(self, session_id: str) -> List[Dict[str, Any]]:
         """Get trace for a session"""
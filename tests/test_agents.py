@@ -5,8 +5,12 @@ Tests all agents and core functionality
 
 import pytest
 import asyncio
+import json
+import logging
 import os
 import yaml
+from collections import namedtuple
+from datetime import datetime
 from pathlib import Path
 
 # Add project root to path
@@ -14,10 +18,44 @@ import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from agents.spec_parser import SpecificationParserAgent
-from agents.ansible_generator import AnsibleGeneratorAgent
-from agents.code_reviewer import CodeReviewAgent
+from agents.ansible_generator import AnsibleGeneratorAgent, _render_spec_sections
+from agents.code_reviewer import CodeReviewAgent, Issue
+from agents import _llm_cache
+from agents._textutil import (
+    OFFLOAD_THRESHOLD,
+    clean_response,
+    clean_response_async,
+    strip_code_fences
+)
+from agents._tokens import (
+    CHARS_PER_TOKEN,
+    MODEL_CONTEXT_TOKENS,
+    check_prompt_size,
+    estimate_tokens
+)
 from memory.session_manager import SessionManager, Session
-from observability.logger import MetricsCollector
+from observability.logger import MetricsCollector, Tracer, setup_logger
+
+
+Response = namedtuple("Response", ["text"])
+
+
+class MockModel:
+    """Model stub that answers every prompt with one pre-built response"""
+    
+    def __init__(self, text: str):
+        self.response = Response(text)
+    
+    async def generate_content_async(self, prompt, **kwargs):
+        return self.response
+
+
+@pytest.fixture(autouse=True)
+def isolated_llm_cache(tmp_path, monkeypatch):
+    """Keep LLM cache entries out of the repo and apart between tests"""
+    cache_dir = tmp_path / "llm_cache"
+    monkeypatch.setattr(_llm_cache, "CACHE_DIR", str(cache_dir))
+    return cache_dir
 
 
 class TestSpecificationParser:
@@ -26,14 +64,9 @@ class TestSpecificationParser:
     @pytest.fixture
     def parser(self):
         """Create parser instance"""
-        # Mock model for testing
-        class MockModel:
-            async def generate_content_async(self, prompt):
-                class Response:
-                    text = "Valid: yes\nIssues: none\nRecommendations: none"
-                return Response()
-        
-        return SpecificationParserAgent(MockModel())
+        return SpecificationParserAgent(
+            MockModel("Valid: yes\nIssues: none\nRecommendations: none")
+        )
     
     @pytest.fixture
     def valid_spec_file(self, tmp_path):
@@ -83,6 +116,20 @@ class TestSpecificationParser:
         
         assert result["valid"] is False
         assert "missing required fields" in result["error"].lower()
+    
+    def test_validate_structure_rejects_wrong_shapes(self, parser):
+        """Test validation of non-mapping and empty-list specifications"""
+        assert parser._validate_structure(None)["valid"] is False
+        assert parser._validate_structure({"automation_spec": "x"})["valid"] is False
+        
+        spec = {"automation_spec": {
+            "name": "test",
+            "description": "test",
+            "target_devices": ["router"],
+            "tasks": []
+        }}
+        result = parser._validate_structure(spec)
+        assert result["error"] == "At least one task must be specified"
 
 
 class TestSessionManager:
@@ -138,6 +185,19 @@ class TestSessionManager:
         assert len(session.context) == 3
         assert "compacted_items" in session.metadata
     
+    def test_session_history_is_bounded(self, tmp_path):
+        """Test history keeps only the most recent entries"""
+        manager = SessionManager(memory_dir=str(tmp_path), history_limit=4)
+        session = manager.create_session("bounded")
+        for i in range(10):
+            session.add_context(f"key_{i}", i)
+        
+        assert len(session.history) == 4
+        assert session.to_dict()["history"][0]["key"] == "key_6"
+        
+        session.compact_context(keep_recent=2)
+        assert list(session.context) == ["key_8", "key_9"]
+    
     def test_memory_bank_persistence(self, session_manager):
         """Test memory bank storage and retrieval"""
         session = session_manager.create_session("test_session_5")
@@ -153,16 +213,133 @@ class TestSessionManager:
         # Get statistics
         stats = session_manager.get_statistics()
         assert stats["total_sessions"] >= 1
+    
+    def test_statistics_track_restored_sessions(self, tmp_path):
+        """Test running statistics follow re-stores and reloads"""
+        manager = SessionManager(memory_dir=str(tmp_path))
+        session = manager.create_session("stats")
+        session.increment_metric("agent_calls", 2)
+        session.metadata.update({"execution_time": 4.0, "success": False})
+        manager.store_session(session)
+        
+        session.increment_metric("agent_calls", 3)
+        session.metadata.update({"execution_time": 6.0, "success": True})
+        manager.store_session(session)
+        
+        expected = {
+            "total_sessions": 1,
+            "avg_execution_time": 6.0,
+            "success_rate": 100.0,
+            "total_agent_calls": 5
+        }
+        assert manager.get_statistics() == expected
+        manager.flush()
+        assert SessionManager(memory_dir=str(tmp_path)).get_statistics() == expected
+    
+    def test_memory_bank_appends_and_compacts(self, tmp_path):
+        """Test stores append records and reloading keeps the latest"""
+        manager = SessionManager(memory_dir=str(tmp_path))
+        assert manager.memory_bank == {}
+        session = manager.create_session("repeat")
+        for i in range(3):
+            session.increment_metric("agent_calls")
+            manager.store_session(session)
+        manager.flush()
+        
+        # Three records for one session exceed the 2x threshold
+        with open(manager.memory_bank_path) as f:
+            assert len(f.readlines()) == 1
+        
+        reloaded = SessionManager(memory_dir=str(tmp_path))
+        assert reloaded.memory_bank["repeat"]["metrics"]["agent_calls"] == 3
+    
+    def test_memory_bank_loads_on_first_use(self, tmp_path):
+        """Test stores before the first read are appended, then loaded"""
+        manager = SessionManager(memory_dir=str(tmp_path))
+        manager.store_session(manager.create_session("first"))
+        manager.flush()
+        
+        manager = SessionManager(memory_dir=str(tmp_path))
+        manager.store_session(manager.create_session("second"))
+        assert manager._memory_bank is None
+        
+        assert list(manager.memory_bank) == ["first", "second"]
+        assert manager.get_statistics()["total_sessions"] == 2
+    
+    def test_bad_records_skipped_without_rewrite(self, tmp_path):
+        """Test malformed memory bank lines are skipped, not compacted away"""
+        manager = SessionManager(memory_dir=str(tmp_path))
+        manager.store_session(manager.create_session("first"))
+        manager.store_session(manager.create_session("second"))
+        manager.flush()
+        with open(manager.memory_bank_path, 'a') as f:
+            f.write('{"x": 1}\n[1, 2]\nnull\n')
+        
+        reloaded = SessionManager(memory_dir=str(tmp_path))
+        assert reloaded.get_statistics()["total_sessions"] == 2
+        reloaded.flush()
+        
+        with open(manager.memory_bank_path) as f:
+            assert len(f.readlines()) == 5
+    
+    def test_legacy_memory_bank_imported_before_first_store(self, tmp_path):
+        """Test a store before the first read still imports memory_bank.json"""
+        legacy = SessionManager(memory_dir=str(tmp_path))
+        legacy_bank = {"old": legacy.create_session("old").to_dict()}
+        with open(tmp_path / "memory_bank.json", 'w') as f:
+            json.dump(legacy_bank, f, default=str)
+        
+        manager = SessionManager(memory_dir=str(tmp_path))
+        manager.store_session(manager.create_session("new"))
+        manager.flush()
+        
+        reloaded = SessionManager(memory_dir=str(tmp_path))
+        assert list(reloaded.memory_bank) == ["old", "new"]
+    
+    def test_retrieve_similar_sessions_index(self, session_manager):
+        """Test keyword index ranking follows re-stored descriptions"""
+        for session_id, description in [
+            ("a", "configure bgp peering"),
+            ("b", "configure ospf areas"),
+            ("c", "configure bgp peering on spine"),
+        ]:
+            session = session_manager.create_session(session_id)
+            session.add_context("parsed_spec", {"description": description})
+            session_manager.store_session(session)
+        
+        results = session_manager.retrieve_similar_sessions("bgp peering")
+        assert [r["session_id"] for r in results] == ["a", "c"]
+        assert results[0]["similarity"] == 2
+        
+        # Re-storing replaces the session's old keywords
+        session = session_manager.get_session("a")
+        session.add_context("parsed_spec", {"description": "vlan trunks"})
+        session_manager.store_session(session)
+        results = session_manager.retrieve_similar_sessions("bgp peering")
+        assert [r["session_id"] for r in results] == ["c"]
 
 
 class TestMetricsCollector:
     """Test metrics collection"""
     
     @pytest.fixture
-    def metrics(self, tmp_path):
+    def make_metrics(self, tmp_path):
+        """Create metrics collectors on temp files, closed after the test"""
+        collectors = []
+        
+        def make(name: str = "test_metrics.jsonl", **kwargs):
+            collector = MetricsCollector(metrics_file=str(tmp_path / name), **kwargs)
+            collectors.append(collector)
+            return collector
+        
+        yield make
+        for collector in collectors:
+            collector.close()
+    
+    @pytest.fixture
+    def metrics(self, make_metrics):
         """Create metrics collector with temp file"""
-        metrics_file = tmp_path / "test_metrics.json"
-        return MetricsCollector(metrics_file=str(metrics_file))
+        return make_metrics()
     
     def test_record_request_lifecycle(self, metrics):
         """Test complete request lifecycle"""
@@ -203,6 +380,188 @@ class TestMetricsCollector:
         assert agent_stats["total_calls"] == 3
         assert agent_stats["successful_calls"] == 2
         assert agent_stats["success_rate"] == pytest.approx(66.67, 0.1)
+    
+    def test_metrics_written_on_flush(self, make_metrics, tmp_path):
+        """Test recording defers the file write until flush"""
+        metrics_file = tmp_path / "flushed.jsonl"
+        metrics = make_metrics("flushed.jsonl", flush_interval=60)
+        metrics.record_request_started("flush_1")
+        assert not metrics_file.exists()
+        
+        metrics.flush()
+        saved = json.loads(metrics_file.read_text())
+        assert saved["type"] == "request_started"
+        assert saved["session_id"] == "flush_1"
+    
+    def test_metrics_replayed_from_log(self, make_metrics, tmp_path):
+        """Test reloading replays events and compacts the log"""
+        metrics_file = tmp_path / "events.jsonl"
+        metrics = make_metrics("events.jsonl", flush_interval=60)
+        metrics.record_request_started("replay_1")
+        metrics.record_request_completed("replay_1", 2.5, 3)
+        metrics.record_agent_call("test_agent", "replay_1", 1.0, True)
+        metrics.flush()
+        
+        reloaded = make_metrics("events.jsonl", flush_interval=60)
+        assert reloaded.get_summary() == metrics.get_summary()
+        assert reloaded.metrics == metrics.metrics
+        
+        # The completion was folded into one line per stored entry
+        lines = [json.loads(line) for line in metrics_file.read_text().splitlines()]
+        assert [line["type"] for line in lines] == ["request", "agent_call"]
+    
+    def test_log_timestamps_are_iso(self, make_metrics, tmp_path):
+        """Test the log holds ISO timestamps and replays integer ones"""
+        metrics = make_metrics("iso.jsonl", flush_interval=60)
+        metrics.record_request_started("iso_1")
+        metrics.flush()
+        
+        saved = json.loads((tmp_path / "iso.jsonl").read_text())
+        started = metrics.metrics["requests"][0].timestamp
+        assert datetime.fromisoformat(saved["timestamp"]).timestamp() == pytest.approx(started / 1e9)
+        
+        reloaded = make_metrics("iso.jsonl", flush_interval=60)
+        assert reloaded.metrics["requests"][0].timestamp == started
+    
+    def test_legacy_metrics_imported(self, make_metrics, tmp_path):
+        """Test an old metrics.json is replayed into the new log once"""
+        legacy = {
+            "requests": [
+                {
+                    "session_id": "old_1",
+                    "status": "completed",
+                    "timestamp": "2025-01-02T03:04:05.123456",
+                    "execution_time": 4.0,
+                    "artifacts_count": 2,
+                    "completed_at": "2025-01-02T03:04:09.123456"
+                },
+                {
+                    "session_id": "old_2",
+                    "status": "failed",
+                    "timestamp": "2025-01-02T03:05:00",
+                    "error": "boom",
+                    "failed_at": "2025-01-02T03:05:01"
+                }
+            ],
+            "agent_calls": [{
+                "agent": "test_agent",
+                "session_id": "old_1",
+                "duration": 1.5,
+                "success": True,
+                "timestamp": "2025-01-02T03:04:06"
+            }],
+            "errors": [
+                {"session_id": "old_2", "error": "boom", "timestamp": "2025-01-02T03:05:01"}
+            ]
+        }
+        (tmp_path / "metrics.json").write_text(json.dumps(legacy))
+        
+        metrics = make_metrics("metrics.jsonl", flush_interval=60)
+        summary = metrics.get_summary()
+        assert summary["total_requests"] == 2
+        assert summary["completed_requests"] == 1
+        assert summary["failed_requests"] == 1
+        assert summary["total_errors"] == 1
+        assert summary["agent_statistics"]["test_agent"]["total_calls"] == 1
+        
+        reloaded = make_metrics("metrics.jsonl", flush_interval=60)
+        assert reloaded.get_summary() == summary
+    
+    def test_bounded_entries_keep_totals(self, make_metrics):
+        """Test entries dropped from memory still count after a reload"""
+        metrics = make_metrics("bounded.jsonl", flush_interval=60, max_entries=2)
+        for i in range(3):
+            metrics.record_request_started(f"bounded_{i}")
+            metrics.record_request_completed(f"bounded_{i}", float(i), 1)
+            metrics.record_agent_call("test_agent", f"bounded_{i}", 1.0, i > 0)
+        metrics.flush()
+        assert len(metrics.metrics["requests"]) == 2
+        
+        reloaded = make_metrics("bounded.jsonl", flush_interval=60, max_entries=2)
+        assert reloaded.get_summary() == metrics.get_summary()
+        assert reloaded.get_summary()["completed_requests"] == 3
+    
+    def test_execution_time_percentiles(self, metrics):
+        """Test histogram percentiles stay within their relative error"""
+        assert metrics.get_summary()["execution_time_percentiles"]["p50"] == 0
+        for i in range(1, 101):
+            metrics.record_request_started(f"p_{i}")
+            metrics.record_request_completed(f"p_{i}", float(i), 1)
+        
+        percentiles = metrics.get_summary()["execution_time_percentiles"]
+        assert percentiles["p50"] == pytest.approx(50.5, rel=0.02)
+        assert percentiles["p99"] == pytest.approx(99.01, rel=0.02)
+    
+    def test_shared_instance_per_file(self, tmp_path):
+        """Test instance() returns one collector per metrics file"""
+        path = str(tmp_path / "shared.jsonl")
+        shared = MetricsCollector.instance(path)
+        other = MetricsCollector.instance(str(tmp_path / "other.jsonl"))
+        assert MetricsCollector.instance(path) is shared
+        assert other is not shared
+        
+        other.close()
+        shared.close()
+        assert MetricsCollector.instance(path) is not shared
+        MetricsCollector.instance(path).close()
+    
+    def test_close_stops_writer_and_flushes(self, tmp_path):
+        """Test close() joins the flush thread and writes pending events"""
+        metrics_file = tmp_path / "closed.jsonl"
+        metrics = MetricsCollector(metrics_file=str(metrics_file), flush_interval=60)
+        metrics.record_request_started("close_1")
+        
+        metrics.close()
+        metrics.close()
+        
+        assert not metrics._flusher.is_alive()
+        assert json.loads(metrics_file.read_text())["session_id"] == "close_1"
+
+
+class TestTracer:
+    """Test workflow tracing"""
+    
+    def test_end_trace_closes_latest_running(self):
+        """Test end_trace finishes the most recent matching operation"""
+        tracer = Tracer()
+        tracer.start_trace("s1", "review")
+        tracer.start_trace("s1", "generate")
+        tracer.start_trace("s1", "review")
+        
+        tracer.end_trace("s1", "review", success=False)
+        tracer.end_trace("s1", "missing")
+        
+        statuses = [t["status"] for t in tracer.get_trace("s1")]
+        assert statuses == ["running", "running", "failed"]
+
+
+class TestLogger:
+    """Test logger setup"""
+    
+    def test_no_log_file_under_pytest(self, tmp_path, monkeypatch):
+        """Test setup_logger skips the file handler during tests"""
+        monkeypatch.chdir(tmp_path)
+        logger = setup_logger("tests.no_log_file")
+        logger.info("console only")
+        
+        assert not (tmp_path / "logs").exists()
+    
+    def test_file_logging_can_be_disabled(self, tmp_path, monkeypatch):
+        """Test file_logging=False skips the file handler outside tests"""
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.delenv("PYTEST_CURRENT_TEST")
+        logger = setup_logger("tests.file_logging_off", file_logging=False)
+        logger.info("console only")
+        
+        assert not (tmp_path / "logs").exists()
+    
+    def test_loggers_share_one_queue(self):
+        """Test every logger hands records to the same queue and listener"""
+        first = setup_logger("tests.shared_first", level=logging.DEBUG)
+        second = setup_logger("tests.shared_second", level=logging.WARNING)
+        
+        assert first.handlers[0].queue is second.handlers[0].queue
+        assert not second.isEnabledFor(logging.INFO)
 
 
 class TestAnsibleGenerator:
@@ -211,19 +570,13 @@ class TestAnsibleGenerator:
     @pytest.fixture
     def generator(self, tmp_path):
         """Create generator instance"""
-        class MockModel:
-            async def generate_content_async(self, prompt):
-                class Response:
-                    text = """---
+        gen = AnsibleGeneratorAgent(MockModel("""---
 - name: Test Playbook
   hosts: all
   tasks:
     - name: Test task
       ping:
-"""
-                return Response()
-        
-        gen = AnsibleGeneratorAgent(MockModel())
+"""))
         gen.output_dir = str(tmp_path / "playbooks")
         return gen
     
@@ -250,6 +603,39 @@ class TestAnsibleGenerator:
             assert "name:" in content
             assert "hosts:" in content
     
+    @pytest.mark.asyncio
+    async def test_bundle_shares_generated_at(self, generator, tmp_path, monkeypatch):
+        """Test generate_bundle stamps the playbook with the bundle's timestamp"""
+        from agents import DocumentationAgent, TestGeneratorAgent, generate_bundle
+        
+        stamps = []
+        generate_playbook = generator.generate_playbook
+        
+        async def recording_generate_playbook(parsed_spec, session, generated_at=None):
+            stamps.append(generated_at)
+            return await generate_playbook(parsed_spec, session, generated_at)
+        
+        monkeypatch.setattr(generator, "generate_playbook", recording_generate_playbook)
+        doc_agent = DocumentationAgent(MockModel("# README"))
+        doc_agent.output_dir = str(tmp_path / "docs")
+        test_agent = TestGeneratorAgent(MockModel("scenarios"))
+        test_agent.output_dir = str(tmp_path / "tests")
+        os.makedirs(doc_agent.output_dir)
+        parsed_spec = {
+            "name": "bundle_playbook",
+            "description": "Test",
+            "target_devices": [{"type": "cisco_ios", "count": 1}],
+            "tasks": [{"name": "test", "action": "ping"}]
+        }
+        
+        result = await generate_bundle(
+            parsed_spec, Session(session_id="bundle"), generator, test_agent, doc_agent
+        )
+        
+        assert stamps[0] is not None
+        assert datetime.fromisoformat(stamps[0]).tzinfo is not None
+        assert result["ansible_playbook"]["metadata"]["generated_at"] == stamps[0]
+    
     def test_generate_inventory(self, generator):
         """Test inventory generation"""
         parsed_spec = {
@@ -262,6 +648,39 @@ class TestAnsibleGenerator:
         
         assert "cisco_ios" in inventory
         assert "ansible_network_os" in inventory
+    
+    def test_inventory_writer_matches_yaml(self, generator):
+        """Test the direct inventory writer against the YAML round trip"""
+        parsed_spec = {
+            "target_devices": [
+                {"type": "cisco_ios", "count": 3},
+                {"type": "junos", "count": 1, "connection": "netconf"},
+                {"type": "yes", "count": 1}
+            ]
+        }
+        
+        inventory = yaml.safe_load(generator._generate_inventory(parsed_spec))
+        groups = inventory["all"]["children"]
+        
+        assert list(groups["cisco_ios"]["hosts"]) == [
+            "cisco_ios-001", "cisco_ios-002", "cisco_ios-003"
+        ]
+        assert groups["junos"]["vars"]["ansible_connection"] == "netconf"
+        assert groups["yes"]["vars"]["ansible_network_os"] == "yes"
+    
+    def test_spec_sections_follow_key_order(self):
+        """Test specs differing only in key order render separately"""
+        first = {
+            "name": "spec",
+            "description": "Test",
+            "target_devices": [{"type": "cisco_ios", "count": 1}],
+            "tasks": [{"name": "t", "action": "ping"}]
+        }
+        second = dict(first, tasks=[{"action": "ping", "name": "t"}])
+        
+        assert "- name: t\n  action: ping" in _render_spec_sections(first)
+        assert "- action: ping\n  name: t" in _render_spec_sections(second)
+        assert _render_spec_sections(first) is _render_spec_sections(first)
 
 
 class TestCodeReviewer:
@@ -270,20 +689,14 @@ class TestCodeReviewer:
     @pytest.fixture
     def reviewer(self):
         """Create reviewer instance"""
-        class MockModel:
-            async def generate_content_async(self, prompt):
-                class Response:
-                    text = """ISSUES:
+        return CodeReviewAgent(MockModel("""ISSUES:
 - [SEVERITY: low] Minor formatting issue
 
 RECOMMENDATIONS:
 - Add more comments
 
 SCORE: 4.5/5.0
-"""
-                return Response()
-        
-        return CodeReviewAgent(MockModel())
+"""))
     
     @pytest.mark.asyncio
     async def test_security_scan(self, reviewer, tmp_path):
@@ -301,13 +714,77 @@ SCORE: 4.5/5.0
 """)
         
         session = Session(session_id="test")
-        result = await reviewer._security_scan(str(playbook), session)
+        result = await reviewer._security_scan(playbook.read_text(), session)
         
         # Should detect hardcoded password
         assert len(result["issues"]) > 0
-        assert any("password" in issue["message"].lower() 
+        assert any("password" in issue.message.lower() 
                   for issue in result["issues"])
     
+    @pytest.mark.asyncio
+    async def test_security_scan_ignores_case(self, reviewer, tmp_path):
+        """Test mixed-case keys are matched without lowercasing the file"""
+        playbook = tmp_path / "test.yml"
+        playbook.write_text("""---
+- name: Test
+  hosts: all
+  vars:
+    API_Key: "abc"
+  tasks:
+    - name: Test
+      Shell: echo hi
+      No_Log: False
+""")
+        
+        session = Session(session_id="test")
+        result = await reviewer._security_scan(playbook.read_text(), session)
+        
+        assert [issue.pattern for issue in result["issues"]] == [
+            "api_key:", "no_log: false", "shell:"
+        ]
+        assert result["passed"] is False
+    
+    def test_parse_ai_review_response(self, reviewer):
+        """Test issue extraction from the AI review format"""
+        review = """Summary first.
+ISSUES:
+- [SEVERITY: HIGH] Missing error handling (line 4)
+- [Severity: low] Minor formatting issue
+- Not an issue line
+
+RECOMMENDATIONS:
+- [SEVERITY: critical] Ignored outside the issues section
+"""
+        
+        issues = reviewer._parse_ai_review_response(review)
+        
+        assert [(i.severity, i.message) for i in issues] == [
+            ("high", "Missing error handling (line 4)"),
+            ("low", "Minor formatting issue")
+        ]
+        assert reviewer._parse_ai_review_response("No findings") == []
+    
+    def test_deduplicate_issues(self, reviewer):
+        """Test the same finding from two checks is counted once"""
+        issues = [
+            Issue("security", "high", "Sensitive data may be logged"),
+            Issue("ai_review", "high", "Sensitive  data may be LOGGED"),
+            Issue("ai_review", "medium", "Sensitive data may be logged")
+        ]
+        
+        unique = reviewer._deduplicate_issues(issues)
+        
+        assert unique == [issues[0], issues[2]]
+    
+    def test_deduplicate_keeps_repeats_from_one_check(self, reviewer):
+        """Test one lint rule hit on several lines keeps every line"""
+        issues = [
+            Issue("lint", "medium", "name[missing]: All tasks should be named", line=4),
+            Issue("lint", "medium", "name[missing]: All tasks should be named", line=9)
+        ]
+        
+        assert reviewer._deduplicate_issues(issues) == issues
+    
     def test_calculate_quality_score(self, reviewer):
         """Test quality score calculation"""
         # Perfect score
@@ -318,6 +795,183 @@ SCORE: 4.5/5.0
         score = reviewer._calculate_quality_score(1, 2, 3, 4)
         assert score < 5.0
         assert score >= 0.0
+    
+    @staticmethod
+    def _fake_lint(tmp_path, monkeypatch, report):
+        """Put a stand-in ansible-lint printing report first on PATH"""
+        fake_lint = tmp_path / "bin" / "ansible-lint"
+        fake_lint.parent.mkdir()
+        fake_lint.write_text(f"""#!/bin/sh
+echo '{json.dumps(report)}'
+exit 2
+""")
+        fake_lint.chmod(0o755)
+        monkeypatch.setenv("PATH", f"{fake_lint.parent}{os.pathsep}{os.environ['PATH']}")
+    
+    @pytest.mark.asyncio
+    async def test_batch_lint_routes_issues(self, reviewer, tmp_path, monkeypatch):
+        """Test one ansible-lint run splits findings per playbook"""
+        first = str(tmp_path / "first.yml")
+        second = str(tmp_path / "second.yml")
+        
+        # Flag only the first playbook
+        self._fake_lint(tmp_path, monkeypatch, [{
+            "check_name": "yaml[truthy]",
+            "description": "Truthy value should be one of [false, true]",
+            "severity": "major",
+            "location": {"path": first, "lines": {"begin": 3}}
+        }])
+        
+        results = await reviewer.lint_playbooks([first, second])
+        
+        assert results[first]["passed"] is False
+        assert results[first]["issues"][0]["line"] == 3
+        assert results[first]["issues"][0]["severity"] == "high"
+        assert results[second]["passed"] is True
+        assert results[second]["issues"] == []
+    
+    @pytest.mark.asyncio
+    async def test_batch_lint_unmatched_findings_fail(self, reviewer, tmp_path, monkeypatch):
+        """Test findings outside the batch fail playbooks instead of vanishing"""
+        first = str(tmp_path / "first.yml")
+        second = str(tmp_path / "second.yml")
+        
+        self._fake_lint(tmp_path, monkeypatch, [{
+            "check_name": "name[missing]",
+            "description": "All tasks should be named",
+            "severity": "major",
+            "location": {"path": "roles/common/tasks/main.yml", "lines": {"begin": 1}}
+        }])
+        
+        results = await reviewer.lint_playbooks([first, second])
+        
+        assert results[first]["passed"] is False
+        assert results[second]["passed"] is False
+
+
+class TestLLMCache:
+    """Test the LLM response disk cache"""
+    
+    @pytest.fixture
+    def counting_model(self):
+        """Model that counts how often it is called"""
+        class CountingModel:
+            calls = 0
+            
+            async def generate_content_async(self, prompt, **kwargs):
+                CountingModel.calls += 1
+                return Response(f"response {CountingModel.calls}")
+        
+        return CountingModel()
+    
+    @pytest.mark.asyncio
+    async def test_repeat_prompt_served_from_cache(
+        self, counting_model
+    ):
+        """Test identical prompts only reach the model once"""
+        first = await _llm_cache.cached_generate(counting_model, "prompt", "test")
+        second = await _llm_cache.cached_generate(counting_model, "prompt", "test")
+        other = await _llm_cache.cached_generate(counting_model, "other", "test")
+        
+        assert first == second == "response 1"
+        assert other == "response 2"
+        assert counting_model.calls == 2
+    
+    @pytest.mark.asyncio
+    async def test_streamed_response_written_through(self, isolated_llm_cache):
+        """Test streamed chunks are joined and stored as one entry"""
+        class Chunk:
+            def __init__(self, text):
+                self.text = text
+        
+        class StreamingModel:
+            async def generate_content_async(self, prompt, stream=False):
+                assert stream is True
+                
+                async def chunks():
+                    for text in ("---\n", "- name: ", "Test\n"):
+                        yield Chunk(text)
+                return chunks()
+        
+        text = await _llm_cache.cached_generate(StreamingModel(), "prompt", "test")
+        
+        assert text == "---\n- name: Test\n"
+        entries = list((isolated_llm_cache / "test").iterdir())
+        assert len(entries) == 1
+        assert entries[0].read_text() == text
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_prompts_share_one_call(
+        self, counting_model, monkeypatch
+    ):
+        """Test concurrent identical prompts are deduplicated"""
+        monkeypatch.setenv("NAUTO_LLM_CACHE", "off")
+        
+        results = await asyncio.gather(*[
+            _llm_cache.cached_generate(counting_model, "prompt", "test")
+            for _ in range(3)
+        ])
+        
+        assert results == ["response 1"] * 3
+        assert counting_model.calls == 1
+    
+    def test_content_digest_ignores_key_order(self):
+        """Test equal specs hash alike regardless of key order"""
+        first = {"name": "spec", "tasks": [{"name": "t", "action": "ping"}]}
+        second = {"tasks": [{"action": "ping", "name": "t"}], "name": "spec"}
+        
+        assert _llm_cache.content_digest(first) == _llm_cache.content_digest(second)
+        assert _llm_cache.content_digest(first) != _llm_cache.content_digest({})
+    
+    @pytest.mark.asyncio
+    async def test_cache_can_be_disabled(
+        self, counting_model, isolated_llm_cache, monkeypatch
+    ):
+        """Test NAUTO_LLM_CACHE=off bypasses the cache"""
+        monkeypatch.setenv("NAUTO_LLM_CACHE", "off")
+        
+        await _llm_cache.cached_generate(counting_model, "prompt", "test")
+        await _llm_cache.cached_generate(counting_model, "prompt", "test")
+        
+        assert counting_model.calls == 2
+        assert not isolated_llm_cache.exists()
+
+
+class TestTextUtilities:
+    """Test model response clean-up helpers"""
+    
+    def test_strip_code_fences(self):
+        """Test fenced and unfenced responses"""
+        assert strip_code_fences("```yaml\n---\n- name: x\n```") == "---\n- name: x"
+        assert strip_code_fences("```\n---\n- name: x") == "---\n- name: x"
+        assert strip_code_fences("```\n```") == ""
+        assert strip_code_fences("---\n- name: x") == "---\n- name: x"
+    
+    @pytest.mark.asyncio
+    async def test_clean_response_offloads_large_text(self):
+        """Test inline and worker-thread clean-up give the same result"""
+        small = "```yaml\n- name: x\n```\n"
+        large = small.replace("x", "x" * OFFLOAD_THRESHOLD)
+        
+        assert await clean_response_async(small, yaml_document=True) == (
+            "---\n- name: x"
+        )
+        assert await clean_response_async(large) == clean_response(large)
+
+
+class TestTokenEstimation:
+    """Test prompt token estimates"""
+    
+    def test_estimate_tokens(self):
+        """Test the character-based estimate"""
+        assert estimate_tokens("") == 0
+        assert estimate_tokens("abcd") == 1
+        assert estimate_tokens("abcde") == 2
+    
+    def test_oversized_prompt_rejected(self):
+        """Test prompts beyond the context window fail before the API call"""
+        with pytest.raises(ValueError):
+            check_prompt_size("x" * (MODEL_CONTEXT_TOKENS * CHARS_PER_TOKEN))
 
 
 # Integration Tests